@@ -1,12 +1,21 @@
 from flask_caching import Cache
 from helper.utils import prettify_number
-from helper.data_preparation import filter_by_dates, sumurize_by_country, filter_df, get_daily_case
-from data.collect_data import collect_data
-import collections
+from helper.dataset import Dataset, columnar_path
+from helper.result_cache import ResultCache, normalize_selection
+from helper.refresh import RefreshScheduler
+from helper.metrics import metrics, instrument_callbacks
+from helper.auto_zoom import MAP_PIXELS, MAX_ZOOM, MIN_ZOOM, PADDING, LocationIndex
+from helper.figure_encoding import TYPED_ARRAYS, encode_figure
+from helper.api import register_api
+from helper.conditional import ConditionalResponses
+from helper.dash_utilities import Card, Container, Header
+from helper.level_of_detail import (MAX_LATITUDE, MAX_MARKERS, TILE_PIXELS, cluster_locations, in_tiles,
+                                    parse_view, view_key, visible_tiles)
+from helper.startup import file_stamp, read_startup, startup_key, write_startup
+import glob
 import os
 from dotenv import load_dotenv
 
-import pandas as pd
 import numpy as np
 
 import dash
@@ -14,16 +23,21 @@ from dash import Dash
 import dash_bootstrap_components as dbc
 import dash_core_components as dcc
 import dash_html_components as html
-from dash.dependencies import Output, Input
+from dash.dependencies import Output, Input, State, ClientsideFunction
+from dash.exceptions import PreventUpdate
 
 import plotly.graph_objects as go
-import plotly.express as px
+import plotly.colors
 import plotly.io as pio
 pio.templates.default = "plotly_white"
 
 
 load_dotenv()
 MAPBOX_TOKEN = os.environ.get('MAPBOX_TOKEN')
+# ship the dataset once and compute the views in the browser
+CLIENTSIDE_MODE = os.environ.get('CLIENTSIDE_MODE', '0') == '1'
+# round the figures and send the daily dates as x0/dx (helper/figure_encoding.py)
+COMPACT_FIGURES = os.environ.get('COMPACT_FIGURES', '1') == '1'
 
 DEFAULT_MARGIN = dict(l=10, r=10, t=10, b=10)
 
@@ -32,32 +46,93 @@ app = Dash(__name__, external_stylesheets=EXTERNAL_STYLESHEETS,  meta_tags=[
            {"name": "viewport", "content": "width=device-width, initial-scale=1"}])
 server = app.server
 
-# Refresh and cache the data every H hours
 cache = Cache(server, config={
     'CACHE_TYPE': 'filesystem',
-    'CACHE_DIR': 'cache-directory'
+    'CACHE_DIR': 'cache-directory',
+    'CACHE_THRESHOLD': 1000
 })
+
+# Refresh the data every H hours in a background thread, only the new or revised
+# days are processed. The sources can be pointed to local files or to another server
+# with the URL_* variables ('none' skips a source), or all of them to the files of
+# the same names in DATA_SOURCE_DIR. The US county series, not shown by the app, are
+# only collected when URL_US_CONFIRMED and URL_US_DEATH are set
 HOURS = 24
 TIMEOUT = HOURS*60*60
 FILE_PATH = 'data/spreading_covid19.csv'
-
-
-@cache.memoize(timeout=TIMEOUT)
-def refresh_data(FILE_PATH):
-    collect_data(saving_path=FILE_PATH)
-    return True
-
-
-# Load the file
-covid19 = pd.read_csv(FILE_PATH, parse_dates=['Date'])
-countries = covid19['State'].unique()
+DATA_SOURCES = {name.lower(): None if os.environ[name] == 'none' else os.environ[name]
+                for name in ('URL_CONFIRMED', 'URL_DEATH', 'URL_RECOVERED', 'URL_US_CONFIRMED', 'URL_US_DEATH')
+                if os.environ.get(name)}
+if os.environ.get('DATA_SOURCE_DIR'):
+    DATA_SOURCES['source_dir'] = os.environ['DATA_SOURCE_DIR']
+
+# With PRELOAD=1 gunicorn imports the app in its master and the workers start the
+# scheduler after the fork (gunicorn.conf.py), no thread runs in the master
+PRELOAD = os.environ.get('PRELOAD', '0') == '1'
+
+scheduler = RefreshScheduler(
+    FILE_PATH, interval=TIMEOUT, incremental=True, **DATA_SOURCES)
+if not os.path.exists(FILE_PATH):
+    scheduler.run_once(wait=True)
+if not PRELOAD:
+    scheduler.start()
+
+# Outputs of the panels by (countries, time_range, dataset version, panel)
+# and of update_map by (time_range, dataset version)
+results = ResultCache(cache, max_entries=3*128, timeout=TIMEOUT, prefix='panels')
+maps = ResultCache(cache, max_entries=8, timeout=TIMEOUT, prefix='map')
+shipped = ResultCache(cache, max_entries=2, timeout=TIMEOUT, prefix='dataset')
+# compressed bodies of the callback responses by ETag and content coding
+responses = ResultCache(cache, max_entries=64, timeout=TIMEOUT, prefix='response')
+
+
+CACHES = {'results': results, 'maps': maps, 'dataset': shipped, 'responses': responses}
+
+
+@server.route('/cache-stats')
+def cache_stats():
+    return {name: cache.stats() for name, cache in CACHES.items()}
+
+
+# Prometheus metrics of this worker: stage durations, payload sizes and cache hit rates
+instrument_callbacks(server, metrics, app.callback_map)
+metrics.describe('covid19_cache_lookups_total', 'Result cache lookups by cache and outcome')
+metrics.gauge('covid19_cache_lookups_total', lambda: {
+    (('cache', name), ('result', result)): cache.counters[result]
+    for name, cache in CACHES.items()
+    for result in ('local_hits', 'shared_hits', 'misses')}, kind='counter')
+metrics.describe('covid19_cache_hit_ratio', 'Share of the result cache lookups that hit')
+metrics.gauge('covid19_cache_hit_ratio', lambda: {
+    (('cache', name),): cache.stats()['hit_rate'] for name, cache in CACHES.items()})
+
+
+@server.route('/metrics')
+def prometheus_metrics():
+    return server.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+# Load the file, it is parsed again only when its content changes
+DATA_PATH = columnar_path(FILE_PATH) if os.path.exists(
+    columnar_path(FILE_PATH)) else FILE_PATH
+dataset = Dataset(DATA_PATH)
+# country list and default views prebuilt for this data file by a previous boot, the
+# dataset (and pandas) is then only loaded by the first callback. They are built again
+# when the settings of the figures or the code building them changed
+HERE = os.path.dirname(os.path.abspath(__file__))
+STARTUP_KEY = startup_key(
+    {'compact_figures': COMPACT_FIGURES, 'typed_arrays': TYPED_ARRAYS, 'plotly': plotly.__version__},
+    [os.path.join(HERE, 'app.py')] + glob.glob(os.path.join(HERE, 'helper', '*.py')))
+startup = read_startup(DATA_PATH, STARTUP_KEY)
+countries = startup['countries'] if startup else dataset.data.locations['State'].unique().tolist()
+
+# Read-only API on the same snapshot: /api/summary and /api/series
+register_api(server, dataset.get)
 
 # Colors
 RED = '#ed1d30'
 BLUE = '#2e72ff'
 GREY = "#6c757d"
-COLORS = px.colors.qualitative.Plotly
-COLORS = px.colors.qualitative.Plotly * int(len(countries)/len(COLORS)+1)
+COLORS = plotly.colors.qualitative.Plotly
 
 
 '''-------------------------------------------------------------------------------------------
@@ -95,27 +170,66 @@ one_line_report = dcc.Markdown(
     id='one_line_report'
 )
 
-header = html.Div([title, filters, one_line_report], className='header')
+# time-lapse of the map: the frames are loaded with the first click on play, then by
+# chunks as the playback advances (helper/timelapse.py, assets/clientside.js)
+timelapse = html.Div([
+    html.Button('▶', id='timelapse_play', n_clicks=0),
+    dcc.Slider(id='timelapse_day', min=0, max=0, step=1, value=0, updatemode='drag'),
+    html.Span(id='timelapse_date'),
+    dcc.Interval(id='timelapse_tick', interval=150, disabled=True),
+    dcc.Store(id='timelapse_meta'),
+    dcc.Store(id='timelapse_wanted'),
+    dcc.Store(id='timelapse_chunk'),
+    dcc.Store(id='timelapse_frame'),
+], className='timelapse')
+
+# the counter is loaded first (priority 0)
+header = Header(title, elm=[filters, timelapse], report=one_line_report, className='header')
 
 remove_buton = ["resetViewMapbox", "", "toImage", "", "", "toggleHover"]
 MAP_CONFIG = {'modeBarButtonsToRemove': remove_buton,
               'showAxisDragHandles': False, "displayModeBar": True, "displaylogo": False}
 DASH_CONFIG = {'displayModeBar': False, 'showAxisDragHandles': False}
 
-card_map = dcc.Graph(id="maps", config=MAP_CONFIG, className='card')
-card_virality = dcc.Graph(
-    id="virality_plot", config=DASH_CONFIG, className='card')
-detailed_pot = dcc.Graph(id="detailed_plot",
-                         config=DASH_CONFIG, className='card')
-
-first_row = html.Div([card_map, card_virality], id='first_row')
-cards = html.Div([first_row, detailed_pot],
-                 className='cards')
-
-
-app.layout = html.Div([
-    header,
-    cards
+# Cards above the fold are loaded once the counter is, the detailed plot when it is
+# scrolled into view (helper/dash_utilities.py)
+card_map = Card("maps", dash_config=MAP_CONFIG, className='card', priority=1, data=('map_base', 'data'))
+card_map.format(row_number=1)
+map_base = dcc.Store(id='map_base')
+# time range, dataset version and level of detail of map_base
+map_view = dcc.Store(id='map_view')
+# zoom and center of the map showing the selected countries
+map_focus = dcc.Store(id='map_focus')
+
+# client-side mode: the dataset is kept in the local storage of the browser and
+# only downloaded again when the version changes
+dataset_stores = html.Div([
+    dcc.Store(id='dataset_store', storage_type='local'),
+    dcc.Store(id='dataset_version', storage_type='local'),
+    dcc.Interval(id='dataset_poll', interval=10*60*1000),
+]) if CLIENTSIDE_MODE else html.Div()
+# the virality figure of update_virality, the time-lapse draws its cursor over it in the browser
+card_virality = Card("virality_plot", dash_config=DASH_CONFIG, className='card', priority=1,
+                     data=('virality_base', 'data'))
+card_virality.format(row_number=1)
+virality_base = dcc.Store(id='virality_base')
+detailed_pot = Card("detailed_plot", dash_config=DASH_CONFIG, className='card', priority=2, lazy=True)
+detailed_pot.format(row_number=2)
+
+container = Container([card_map, card_virality, detailed_pot], header=header, background_color='#FBFBFB',
+                      className='cards')
+app.layout = container.create()
+
+# Same dataset version and same request give the same response: it is tagged, answered
+# with a 304 on If-None-Match and compressed only once, for the callbacks and the API
+conditional = ConditionalResponses(server, lambda: dataset.get().version, responses, paths=['/api/'],
+                                   gates=container.gates())
+app.layout.children.extend([
+    map_base,
+    map_view,
+    map_focus,
+    virality_base,
+    dataset_stores
 ])
 
 
@@ -123,94 +237,120 @@ app.layout = html.Div([
                                             INTERACT
    -------------------------------------------------------------------------------------------
 '''
-selected_country = []
-
-
 @app.callback(
     Output('country_dropdown', 'value'),
     [
         Input('maps', 'clickData'),
         Input('maps', 'selectedData')
-    ]
+    ],
+    [State('country_dropdown', 'value')]
 )
-def map_selection(click, selected):
+def map_selection(click, selected, current_selection):
+    # the selection is kept by the browser in the dropdown, not by the worker
     context = dash.callback_context
     condition = context.triggered[0]["prop_id"].split(".")[-1]
-    global selected_country
 
     if condition == "clickData":
-        selected_country.append(click["points"][0]["text"])
-        # delete the duplicate clicked countries
-        selected_country = [country for country, count in collections.Counter(
-            selected_country).items() if count <= 1]
-        return selected_country
-
-    if condition == "selectedData":
-        return [country["text"] for country in selected["points"]]
+        return toggle_selection(current_selection, point_locations(click["points"][0]))
+
+    if condition == "selectedData" and selected:
+        return [country for point in selected["points"] for country in point_locations(point)]
     # reset the list
-    selected_country = []
     return None
 
 
-@app.callback(
-    [
-        Output('one_line_report', 'children'),
-        Output('maps', 'figure'),
-        Output('virality_plot', 'figure'),
-        Output('detailed_plot', 'figure'),
-    ],
-    [
-        Input('country_dropdown', 'value'),
-        Input('time_dropdown', 'value'),
-    ]
-)
-def global_update(countries, time_range):
-    if refresh_data(FILE_PATH):
-        covid19 = pd.read_csv(FILE_PATH, parse_dates=['Date'])
+def toggle_selection(selection, locations):
+    """Remove the clicked locations already selected and add the others at the end"""
+    selection = selection or []
+    clicked, selected = set(locations), set(selection)
+    kept = [country for country in selection if country not in clicked]
+    added = [country for country in dict.fromkeys(locations) if country not in selected]
+    return kept + added
 
-    filtered_df = filter_df(covid19, countries, time_range)
-    report_by_country = sumurize_by_country(filtered_df)
-    daily_cases = get_daily_case(filtered_df)
 
-    # link clicked country and country dropdown to have a smooth interactive clicking map
-    global selected_country
-    selected_country = countries
-    if not selected_country:
-        selected_country = []
+# coordinates of the locations by State, built once per dataset version
+location_indexes = {}
 
-    # MAP
-    # --------------------------------------------------------
-    df_map = filter_by_dates(covid19, time_range)
-    df_map = sumurize_by_country(df_map)
-    df_map = df_map.set_index('State')
 
-    # Colorize marker
-    if countries:
-        # country_order = df_map.loc[countries].sort_values(
-        # by = 'Confirmed').index
-        df_map['marker_color'] = GREY
-        df_map.loc[countries,
-                   'marker_color'] = COLORS[: len(countries)]
+def location_index(snapshot):
+    index = location_indexes.get(snapshot.version)
+    if index is None:
+        location_indexes.clear()
+        index = location_indexes[snapshot.version] = LocationIndex(snapshot.cube.locations)
+    return index
+
+
+def focus_map(countries):
+    # a new selection resets the view of the map (uirevision), the time range doesn't
+    countries = normalize_selection(countries)
+    zoom, center = location_index(dataset.get()).zoom_and_center(countries)
+    return {'zoom': zoom, 'center': center, 'revision': '|'.join(countries)}
+
+
+def point_locations(point):
+    # a cluster of the map has its locations after its counts in customdata
+    customdata = point.get("customdata") or []
+    return customdata[2] if len(customdata) > 2 else [point["text"]]
+
+
+def update_map(time_range, relayout, focus, current_view):
+    # large datasets are clustered by zoom level and only the visible clusters are sent,
+    # the map is only updated when the clusters change
+    triggered = [trigger['prop_id'] for trigger in dash.callback_context.triggered]
+    if 'map_focus.data' in triggered and focus:
+        # the map zooms on a new selection
+        relayout = {'mapbox.zoom': focus['zoom'], 'mapbox.center': focus['center']}
+    snapshot = dataset.get()
+    view = {'version': snapshot.version, 'time_range': time_range,
+            'detail': view_key(snapshot.cube.located.sum(), relayout)}
+    if view == current_view:
+        raise PreventUpdate
+    key = map_key(view)
+    return maps.get_or_compute(key, lambda: build_map(snapshot, time_range, relayout)), view
+
+
+def map_key(view):
+    return maps.make_key(view['version'], None, f"{view['time_range']}:{view['detail']}")
 
-    else:
-        df_map['marker_color'] = BLUE
+
+def build_map(snapshot, time_range, relayout=None):
+    laps = metrics.laps('update_map')
+    df_map = snapshot.derived.summarize(time_range=time_range)
+    clustered = snapshot.cube.located.sum() > MAX_MARKERS
+    if clustered:
+        level, tiles = visible_tiles(*parse_view(relayout))
+        df_map = cluster_locations(df_map, level)
+        # the marker sizes are relative to the largest cluster of the level, not of the view
+        max_size = max(df_map['Confirmed'].max(), 0)
+        df_map = df_map[in_tiles(df_map, tiles)]
+        laps.lap('cluster')
+    df_map = df_map.set_index('State')
+    laps.lap('summarize')
 
     # set the marker size
     bubble_size = df_map['Confirmed']
     bubble_size[bubble_size < 0] = 0
+    if not clustered:
+        max_size = max(bubble_size)
+        customdata = np.dstack((df_map['Confirmed'], df_map['Death']))[0]
+    else:
+        # the members of a cluster are selected together
+        customdata = [[confirmed, death] + ([locations] if len(locations) > 1 else [])
+                      for confirmed, death, locations in zip(
+                          df_map['Confirmed'].tolist(), df_map['Death'].tolist(), df_map['Locations'])]
 
     map_plot = go.Figure(
         go.Scattermapbox(
             lat=df_map['Lat'],
             lon=df_map['Long'],
-            customdata=np.dstack((df_map['Confirmed'], df_map['Death']))[0],
+            customdata=customdata,
             text=df_map.index,
             marker=dict(
-                color=df_map['marker_color'],
+                color=BLUE,
                 size=bubble_size,
                 sizemode='area',
                 sizemin=2,
-                sizeref=2. * max(bubble_size) / (40.**2),
+                sizeref=2. * max_size / (40.**2),
             ),
             hovertemplate='%{customdata[0]:.3s} case<br>' +
             '%{customdata[1]:.3s} deaths<extra> %{text}</extra>'
@@ -218,6 +358,8 @@ def global_update(countries, time_range):
     )
     map_plot.update_layout(
         margin=DEFAULT_MARGIN,
+        # keep the zoom and the position of the map when the markers change
+        uirevision='map',
         mapbox=dict(
             zoom=0.5,
             style='mapbox://styles/axelitorosalito/ckb2erv2q148d1jnp7959xpz0',
@@ -225,21 +367,81 @@ def global_update(countries, time_range):
         ),
         showlegend=False
     )
+    # the marker colors are set in the browser (assets/clientside.js)
+    palette = {'default': BLUE, 'other': GREY, 'selected': COLORS}
+    map_base = {'figure': figure_output(map_plot), 'palette': palette}
+    laps.lap('figure')
+    return map_base
+
+
+def figure_output(figure):
+    figure = figure.to_dict()
+    return encode_figure(figure) if COMPACT_FIGURES else figure
+
+
+# Every panel of the page has its own callback and cached output, so the counter is not
+# held back by the figures and the detailed plot is only built when it is scrolled into view
+def panel(part, countries, time_range):
+    # the selection is sorted so that every order of the same countries shares one result
+    snapshot = dataset.get()
+    key = results.make_key(snapshot.version, countries, time_range, part)
+    return results.get_or_compute(key, lambda: PANELS_BUILDERS[part](
+        snapshot, list(normalize_selection(countries)), time_range))
+
+
+def update_report(countries, time_range):
+    return panel('report', countries, time_range)
+
+
+def update_virality(countries, time_range):
+    return panel('virality', countries, time_range)
+
+
+def update_detailed(countries, time_range):
+    return panel('detailed', countries, time_range)
+
+
+def global_update(countries, time_range):
+    """Outputs of the three panels"""
+    return tuple(panel(part, countries, time_range) for part in PANELS_BUILDERS)
+
+
+def build_report(snapshot, countries, time_range):
+    laps = metrics.laps('update_report')
+    # the views without a selection are looked up in the derived series (helper/derived.py)
+    report_by_country = snapshot.derived.summarize(countries, time_range)
+    laps.lap('summarize')
+
+#     # COUNTERS
+#     # --------------------------------------------------------
+    sum_of_cases = report_by_country['Confirmed'].sum()
+    sum_of_cases = prettify_number(sum_of_cases)
+    sum_of_deaths = report_by_country['Death'].sum()
+    sum_of_deaths = prettify_number(sum_of_deaths)
+    return f'👉 **{sum_of_cases} cases** & {sum_of_deaths} deaths'
+
+
+def build_virality(snapshot, countries, time_range):
+    from helper.data_preparation import rolling_mean
+    derived = snapshot.derived
+    laps = metrics.laps('update_virality')
 
     # VIRALITY
     # --------------------------------------------------------
     # filtering by country
     if countries:
         virality_plot = go.Figure()
+        daily_cases = rolling_mean(derived.daily_cases(countries, time_range))
 
         for c in countries:
-            country_daily_cases = daily_cases.loc[:, c]
-            country_daily_cases = country_daily_cases.rolling(
-                7, min_periods=3).mean()
+            # a country without rows, e.g. renamed by a refresh while still selected in a tab
+            if c not in daily_cases:
+                continue
+            country_daily_cases = daily_cases[c]
 
             virality_plot.add_traces(
                 go.Scatter(
-                    x=country_daily_cases.index.get_level_values('Date'),
+                    x=country_daily_cases.index,
                     y=country_daily_cases,
                     name=c,
                     customdata=country_daily_cases,
@@ -250,8 +452,7 @@ def global_update(countries, time_range):
 
     # Worldwide
     else:
-        daily_cases = daily_cases.groupby('Date').sum()
-        daily_cases = daily_cases.rolling(7, min_periods=3).mean()
+        daily_cases = derived.world(time_range)
         virality_plot = go.Figure(
             go.Scatter(
                 x=daily_cases.index,
@@ -269,20 +470,32 @@ def global_update(countries, time_range):
         showline=True, nticks=5, showgrid=True, zeroline=False, fixedrange=True)
     virality_plot.update_layout(
         hovermode="x", showlegend=False, margin=DEFAULT_MARGIN)
+    laps.lap('virality_figure')
+
+    # plain dicts are much cheaper to pickle than figures, and compact ones cheaper to send
+    virality_plot = figure_output(virality_plot)
+    laps.lap('to_dict')
+    return virality_plot
+
+
+def build_detailed(snapshot, countries, time_range):
+    from helper.data_preparation import filter_df, get_evolution
+    covid19, derived = snapshot.data, snapshot.derived
+    laps = metrics.laps('update_detailed')
 
     # DETAILED PLOT:
     # a. global : top10
     # b. by country : evolution overtime
     # --------------------------------------------------------
     if countries:
-        global_evolution = filtered_df.groupby(
-            ['Date', 'State']).sum().reset_index(level='Date')
+        global_evolution = get_evolution(filter_df(covid19, countries, time_range))
         detailed_plot = go.Figure()
         for c in countries:
+            if c not in global_evolution.index:
+                continue
             detailed_plot.add_traces(
                 go.Scatter(
-                    x=global_evolution.loc[[c], 'Date'].map(
-                        lambda x: x.strftime('%d %b %Y')),
+                    x=global_evolution.loc[[c], 'Date'],
                     y=global_evolution.loc[[c], 'Confirmed'],
                     hovertemplate='%{y:.2s} cases',
                     name=c
@@ -291,26 +504,20 @@ def global_update(countries, time_range):
             detailed_plot.update_yaxes(
                 showline=True, nticks=5, fixedrange=True)
             detailed_plot.update_xaxes(
-                showline=False, nticks=5, showgrid=True, fixedrange=True)
+                showline=False, nticks=5, showgrid=True, fixedrange=True,
+                tickformat='%d %b %Y', hoverformat='%d %b %Y')
             detailed_plot.update_layout(
                 hovermode="x", margin=DEFAULT_MARGIN, showlegend=False)
 
     else:
-        top10 = report_by_country.nlargest(10, 'Confirmed')
-        top10.sort_values('Confirmed', inplace=True)
-
-        keep_top_3 = [None] * len(top10)
-        keep_top_3[-3:] = top10['Confirmed'][-3:]
-        keep_top_3 = [prettify_number(x) for x in keep_top_3]
-
-        rate_of_death = (top10['Death']/top10['Confirmed'])*100
+        top10 = derived.top10(time_range)
 
         detailed_plot = go.Figure([
             go.Bar(
                 x=top10['Confirmed'],
                 y=top10['State'],
-                text=keep_top_3,
-                customdata=rate_of_death,
+                text=top10['label'].tolist(),
+                customdata=top10['death_rate'],
                 hovertemplate='%{x:.3s} cases<extra>%{customdata:.1f}% deaths</extra>',
                 marker_color=BLUE),
 
@@ -331,20 +538,221 @@ def global_update(countries, time_range):
         detailed_plot.update_yaxes(
             showgrid=False, showline=False, fixedrange=True)
 
-#     # COUNTERS
-#     # --------------------------------------------------------
-    sum_of_cases = report_by_country['Confirmed'].sum()
-    sum_of_cases = prettify_number(sum_of_cases)
-    sum_of_deaths = report_by_country['Death'].sum()
-    sum_of_deaths = prettify_number(sum_of_deaths)
-
-    output_tuple = (
-        f'👉 **{sum_of_cases} cases** & {sum_of_deaths} deaths',
-        map_plot,
-        virality_plot,
-        detailed_plot,
+    laps.lap('detailed_figure')
+
+    detailed_plot = figure_output(detailed_plot)
+    laps.lap('to_dict')
+    return detailed_plot
+
+
+PANELS_BUILDERS = {'report': build_report, 'virality': build_virality, 'detailed': build_detailed}
+
+
+def build_outputs(snapshot, countries, time_range):
+    """Outputs of the three panels, computed without the cache"""
+    return tuple(build(snapshot, countries, time_range) for build in PANELS_BUILDERS.values())
+
+
+# frames of the time-lapse, computed once per dataset version
+timelapses = {}
+
+
+def timelapse_for(snapshot):
+    frames = timelapses.get(snapshot.version)
+    if frames is None:
+        from helper.timelapse import TimeLapse
+        timelapses.clear()
+        frames = timelapses[snapshot.version] = TimeLapse(snapshot.cube)
+    return frames
+
+
+def timelapse_meta(n_clicks, chunk, stored_meta):
+    # asked again when a chunk comes from a new dataset version
+    snapshot = dataset.get()
+    if not n_clicks or (stored_meta and stored_meta['version'] == snapshot.version):
+        raise PreventUpdate
+    return timelapse_for(snapshot).meta(snapshot.version)
+
+
+def timelapse_chunk(wanted):
+    # a chunk of another version is dropped by the browser, and brings the meta of its version
+    snapshot = dataset.get()
+    frames = timelapse_for(snapshot)
+    if wanted is None or not 0 <= wanted['index'] < frames.n_chunks:
+        raise PreventUpdate
+    return frames.chunk(snapshot.version, wanted['index'])
+
+
+def ship_dataset(n_intervals, stored_version):
+    from helper.clientside import encode_dataset
+    snapshot = dataset.get()
+    if stored_version == snapshot.version:
+        raise PreventUpdate
+    config = {'blue': BLUE, 'red': RED, 'margin': DEFAULT_MARGIN,
+              'palette': {'default': BLUE, 'other': GREY, 'selected': COLORS},
+              'mapbox': dict(zoom=0.5, accesstoken=MAPBOX_TOKEN,
+                             style='mapbox://styles/axelitorosalito/ckb2erv2q148d1jnp7959xpz0'),
+              'template': pio.templates[pio.templates.default].to_plotly_json(),
+              # helper/auto_zoom.zoom_and_center, for the map_focus of the browser
+              'zoom': {'map_pixels': MAP_PIXELS, 'padding': PADDING, 'min': MIN_ZOOM, 'max': MAX_ZOOM,
+                       'tile_pixels': TILE_PIXELS, 'max_latitude': MAX_LATITUDE}}
+    key = shipped.make_key(snapshot.version, None, 0)
+    return shipped.get_or_compute(key, lambda: encode_dataset(snapshot, config)), snapshot.version
+
+
+PANELS = [
+    Output('one_line_report', 'children'),
+    Output('virality_base', 'data'),
+    Output('detailed_plot', 'figure'),
+]
+PANEL_INPUTS = [Input('country_dropdown', 'value'), Input('time_dropdown', 'value')]
+container.register(app)
+if CLIENTSIDE_MODE:
+    app.callback(
+        [Output('dataset_store', 'data'), Output('dataset_version', 'data')],
+        [Input('dataset_poll', 'n_intervals')],
+        [State('dataset_version', 'data')]
+    )(metrics.timed_callback(ship_dataset))
+    app.clientside_callback(
+        ClientsideFunction(namespace='dataset', function_name='map'),
+        Output('map_base', 'data'),
+        [Input('dataset_store', 'data'), Input('time_dropdown', 'value')]
+    )
+    app.clientside_callback(
+        ClientsideFunction(namespace='dataset', function_name='focus'),
+        Output('map_focus', 'data'),
+        [Input('dataset_store', 'data'), Input('country_dropdown', 'value')]
     )
-    return output_tuple
+    app.clientside_callback(
+        ClientsideFunction(namespace='dataset', function_name='panels'),
+        PANELS,
+        [Input('dataset_store', 'data'), Input('country_dropdown', 'value'),
+         Input('time_dropdown', 'value')]
+    )
+else:
+    # every panel waits for the stage of the previous priority
+    container.callback(
+        app, card_map,
+        [Output('map_base', 'data'), Output('map_view', 'data')],
+        [Input('time_dropdown', 'value'), Input('maps', 'relayoutData'), Input('map_focus', 'data')],
+        [State('map_view', 'data')]
+    )(metrics.timed_callback(update_map))
+    container.callback(
+        app, header, PANELS[0], PANEL_INPUTS
+    )(metrics.timed_callback(update_report))
+    container.callback(
+        app, card_virality, PANELS[1], PANEL_INPUTS
+    )(metrics.timed_callback(update_virality))
+    container.callback(
+        app, detailed_pot, PANELS[2], PANEL_INPUTS
+    )(metrics.timed_callback(update_detailed))
+    app.callback(
+        Output('map_focus', 'data'),
+        [Input('country_dropdown', 'value')]
+    )(metrics.timed_callback(focus_map))
+
+app.callback(
+    Output('timelapse_meta', 'data'),
+    [Input('timelapse_play', 'n_clicks'), Input('timelapse_chunk', 'data')],
+    [State('timelapse_meta', 'data')]
+)(metrics.timed_callback(timelapse_meta))
+app.callback(
+    Output('timelapse_chunk', 'data'),
+    [Input('timelapse_wanted', 'data')]
+)(metrics.timed_callback(timelapse_chunk))
+
+# A new selection only recolors the markers of the map and zooms on them, in the browser,
+# and a frame of the time-lapse replaces its markers
+app.clientside_callback(
+    ClientsideFunction(namespace='map', function_name='colorize'),
+    Output('maps', 'figure'),
+    [Input('map_base', 'data'), Input('country_dropdown', 'value'), Input('map_focus', 'data'),
+     Input('timelapse_frame', 'data')]
+)
+app.clientside_callback(
+    ClientsideFunction(namespace='timelapse', function_name='cursor'),
+    Output('virality_plot', 'figure'),
+    [Input('virality_base', 'data'), Input('timelapse_frame', 'data')]
+)
+app.clientside_callback(
+    ClientsideFunction(namespace='timelapse', function_name='toggle'),
+    [Output('timelapse_tick', 'disabled'), Output('timelapse_play', 'children')],
+    [Input('timelapse_play', 'n_clicks')]
+)
+app.clientside_callback(
+    ClientsideFunction(namespace='timelapse', function_name='slider'),
+    Output('timelapse_day', 'max'),
+    [Input('timelapse_meta', 'data')]
+)
+app.clientside_callback(
+    ClientsideFunction(namespace='timelapse', function_name='advance'),
+    Output('timelapse_day', 'value'),
+    [Input('timelapse_tick', 'n_intervals')],
+    [State('timelapse_day', 'value'), State('timelapse_meta', 'data')]
+)
+app.clientside_callback(
+    ClientsideFunction(namespace='timelapse', function_name='frame'),
+    [Output('timelapse_frame', 'data'), Output('timelapse_wanted', 'data'),
+     Output('timelapse_date', 'children')],
+    [Input('timelapse_day', 'value'), Input('timelapse_chunk', 'data'), Input('timelapse_meta', 'data')]
+)
+
+
+
+def default_outputs(snapshot):
+    """Outputs of the callbacks for the page as first loaded, by cache key"""
+    view = {'version': snapshot.version, 'time_range': 0,
+            'detail': view_key(snapshot.cube.located.sum(), None)}
+    return {
+        'maps': {map_key(view): build_map(snapshot, 0)},
+        'results': {results.make_key(snapshot.version, None, 0, part): build(snapshot, [], 0)
+                    for part, build in PANELS_BUILDERS.items()},
+    }
+
+
+def warm():
+    """Load the dataset, again when its file changed, and the indexes derived from it, in the
+    gunicorn master before the workers are forked so that they share its pages"""
+    # waits for the new version instead of serving the current one
+    dataset.refresh()
+    snapshot = dataset.get()
+    location_index(snapshot)
+    # the default views are built here rather than read from the startup snapshot: the
+    # objects their first build creates (plotly validators, pandas caches) are shared too
+    preload_outputs(default_outputs(snapshot))
+    return snapshot
+
+
+def with_mapbox_token(outputs, token):
+    """Outputs with the Mapbox token in the map figures, without it when token is None:
+    the startup snapshot on disk doesn't hold it"""
+    maps = {}
+    for key, map_base in outputs['maps'].items():
+        figure = map_base['figure']
+        mapbox = {name: value for name, value in figure['layout']['mapbox'].items() if name != 'accesstoken'}
+        if token:
+            mapbox['accesstoken'] = token
+        maps[key] = dict(map_base, figure=dict(figure, layout=dict(figure['layout'], mapbox=mapbox)))
+    return dict(outputs, maps=maps)
+
+
+def preload_outputs(outputs):
+    """Put prebuilt outputs, by cache name and key, in the worker LRU of the caches"""
+    for name, values in outputs.items():
+        for key, value in values.items():
+            {'maps': maps, 'results': results}[name].preload(key, value)
+
+
+# The first boot on a data file writes its startup snapshot, the next ones preload
+# its default views instead of building them
+if startup is None:
+    stamp = file_stamp(DATA_PATH)
+    snapshot = dataset.get()
+    write_startup(DATA_PATH, stamp, {'version': snapshot.version, 'countries': countries,
+                                     'outputs': with_mapbox_token(default_outputs(snapshot), None)},
+                  STARTUP_KEY)
+else:
+    preload_outputs(with_mapbox_token(startup['outputs'], MAPBOX_TOKEN))
 
 
 if __name__ == "__main__":
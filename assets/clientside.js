@@ -0,0 +1,640 @@
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    map: {
+        // Color the markers of the map from the selected countries and zoom on them
+        // (app.focus_map), the base figure (update_map) only changes with the time range.
+        // A frame of the time-lapse replaces the markers by the ones of its day
+        colorize: function (base, countries, focus, frame) {
+            if (!base) {
+                return window.dash_clientside.no_update;
+            }
+            var palette = base.palette;
+            var trace = Object.assign({}, base.figure.data[0]);
+            var frameTrace = frame && window.dash_clientside.timelapse.trace(frame);
+            if (frameTrace) {
+                trace = Object.assign(trace, frameTrace, {
+                    marker: Object.assign({}, trace.marker, frameTrace.marker)
+                });
+            }
+            var marker = Object.assign({}, trace.marker);
+
+            if (countries && countries.length) {
+                // same order as the sorted selection of global_update
+                var rank = {};
+                var n = 0;
+                countries.slice().sort().forEach(function (country) {
+                    if (!(country in rank)) {
+                        rank[country] = n++;
+                    }
+                });
+                marker.color = trace.text.map(function (state, i) {
+                    // a cluster (helper/level_of_detail.py) takes the color of its
+                    // first selected location
+                    var data = trace.customdata && trace.customdata[i];
+                    var locations = data && data.length > 2 ? data[2] : [state];
+                    var first = null;
+                    locations.forEach(function (location) {
+                        if (location in rank && (first === null || rank[location] < first)) {
+                            first = rank[location];
+                        }
+                    });
+                    return first === null
+                        ? palette.other
+                        : palette.selected[first % palette.selected.length];
+                });
+            } else {
+                marker.color = palette.default;
+            }
+            trace.marker = marker;
+
+            var layout = base.figure.layout;
+            if (focus) {
+                var mapbox = Object.assign({}, layout.mapbox);
+                if (focus.zoom !== null) {
+                    mapbox.zoom = focus.zoom;
+                    mapbox.center = focus.center;
+                }
+                layout = Object.assign({}, layout, {mapbox: mapbox, uirevision: 'map:' + focus.revision});
+            }
+            return Object.assign({}, base.figure, {data: [trace], layout: layout});
+        }
+    },
+
+    // Progressive loading of the cards (helper/dash_utilities.Container)
+    cards: {
+        // stage of a priority: changes every time its cards got their data
+        loaded: function () {
+            window.dash_clientside.cards.stage = (window.dash_clientside.cards.stage || 0) + 1;
+            return window.dash_clientside.cards.stage;
+        },
+
+        // the lazy cards scrolled into view, the poll stops once all of them were seen
+        visible: function (nIntervals, ids) {
+            var noUpdate = window.dash_clientside.no_update;
+            var seen = Array.prototype.slice.call(arguments, 2);
+            var outputs = ids.map(function (id, i) {
+                var element = document.getElementById(id);
+                if (seen[i] || !element) {
+                    return noUpdate;
+                }
+                var box = element.getBoundingClientRect();
+                return box.top < window.innerHeight && box.bottom > 0 ? true : noUpdate;
+            });
+            var all = outputs.every(function (output, i) {
+                return seen[i] || output === true;
+            });
+            return outputs.concat([all ? true : noUpdate]);
+        },
+
+        // a lazy card requests its data once it was seen, then with every new stage
+        ready: function (visible, loaded) {
+            if (!visible || (arguments.length > 1 && !loaded)) {
+                return window.dash_clientside.no_update;
+            }
+            return arguments.length > 1 ? loaded : true;
+        }
+    }
+});
+
+// Client-side mode (CLIENTSIDE_MODE=1): the dataset is shipped once to the browser
+// (helper/clientside.py) and the views of app.build_map / app.build_outputs are computed here
+(function () {
+    var MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'];
+    var TYPES = {float32: Float32Array, int32: Int32Array, uint16: Uint16Array, uint8: Uint8Array};
+    var DAY = 24 * 60 * 60 * 1000;
+    var decoded = null;
+
+    function typedArray(encoded) {
+        var binary = atob(encoded.data);
+        var bytes = new Uint8Array(binary.length);
+        for (var i = 0; i < binary.length; i++) {
+            bytes[i] = binary.charCodeAt(i);
+        }
+        return new TYPES[encoded.dtype](bytes.buffer);
+    }
+
+    function decode(store) {
+        if (!decoded || decoded.version !== store.version) {
+            decoded = {
+                version: store.version,
+                config: store.config,
+                states: store.states,
+                lat: typedArray(store.lat),
+                long: typedArray(store.long),
+                located: typedArray(store.located),
+                dates: typedArray(store.dates),
+                Confirmed: typedArray(store.Confirmed),
+                Death: typedArray(store.Death)
+            };
+            decoded.nDates = decoded.dates.length;
+            decoded.present = store.present ? typedArray(store.present)
+                : new Uint8Array(store.states.length * decoded.nDates).fill(1);
+        }
+        return decoded;
+    }
+
+    function isoDate(day) {
+        return new Date(day * DAY).toISOString().slice(0, 10);
+    }
+
+    function longDate(day) {
+        var date = new Date(day * DAY);
+        var dd = ('0' + date.getUTCDate()).slice(-2);
+        return dd + ' ' + MONTHS[date.getUTCMonth()] + ' ' + date.getUTCFullYear();
+    }
+
+    // helper.utils.prettify_number
+    function prettify(number) {
+        // round like numpy: scale then round half to even
+        function decimals(value) {
+            var scaled = value * 100;
+            var rounded = Math.abs(scaled % 1) === 0.5 ? 2 * Math.round(scaled / 2) : Math.round(scaled);
+            value = rounded / 100;
+            return Number.isInteger(value) ? value + '.0' : String(value);
+        }
+        if (!number) {
+            return 'None';
+        }
+        if (number > 1e6 - 1) {
+            return decimals(number / 1e6) + 'M';
+        }
+        if (number > 1e3 - 1) {
+            return decimals(number / 1e3) + 'k';
+        }
+        return String(number);
+    }
+
+    // Cube.select
+    function select(data, countries) {
+        var wanted = {};
+        (countries || []).forEach(function (country) {
+            wanted[country] = true;
+        });
+        return data.states.map(function (state) {
+            return !countries || !countries.length || wanted[state] === true;
+        });
+    }
+
+    // Cube.window
+    function dateWindow(data, timeRange, selection) {
+        var last = -1;
+        if (!timeRange) {
+            return 0;
+        }
+        selection.forEach(function (selected, l) {
+            if (!selected) {
+                return;
+            }
+            for (var d = data.nDates - 1; d > last; d--) {
+                if (data.present[l * data.nDates + d]) {
+                    last = d;
+                    break;
+                }
+            }
+        });
+        if (last < 0) {
+            return 0;
+        }
+        var firstDay = data.dates[last] - timeRange;
+        var start = 0;
+        while (start < data.nDates && data.dates[start] <= firstDay) {
+            start++;
+        }
+        return start;
+    }
+
+    // Cube.summarize
+    function summarize(data, countries, timeRange) {
+        var selection = select(data, countries);
+        var start = dateWindow(data, timeRange, selection);
+        var rows = [];
+        selection.forEach(function (selected, l) {
+            if (!selected || !data.located[l]) {
+                return;
+            }
+            var row = {index: l, State: data.states[l], Confirmed: null, Death: null};
+            ['Confirmed', 'Death'].forEach(function (metric) {
+                var high = -Infinity;
+                var low = Infinity;
+                for (var d = start; d < data.nDates; d++) {
+                    var i = l * data.nDates + d;
+                    if (data.present[i]) {
+                        high = Math.max(high, data[metric][i]);
+                        low = Math.min(low, data[metric][i]);
+                    }
+                }
+                row[metric] = high - low;
+            });
+            if (row.Confirmed !== -Infinity) {
+                rows.push(row);
+            }
+        });
+        return {rows: rows, start: start, selection: selection};
+    }
+
+    // Cube.daily_cases: the differences of every location clamped at 0, summed by State
+    function dailyCases(data, selection, start) {
+        var byState = {};
+        var n = data.nDates - start;
+        selection.forEach(function (selected, l) {
+            if (!selected) {
+                return;
+            }
+            var daily = byState[data.states[l]] || (byState[data.states[l]] = new Float64Array(n));
+            var offset = l * data.nDates + start;
+            // no previous row in the window: the first row of the location is 0
+            var seen = false;
+            for (var d = 0; d < n; d++) {
+                if (!seen) {
+                    seen = data.present[offset + d] === 1;
+                    continue;
+                }
+                // the days without a row repeat the previous count: the next row gets the jump
+                daily[d] += Math.max(data.Confirmed[offset + d] - data.Confirmed[offset + d - 1], 0);
+            }
+        });
+        return byState;
+    }
+
+    // data_preparation.rolling_mean
+    function rollingMean(values, window, minPeriods) {
+        var means = new Array(values.length);
+        var total = 0;
+        for (var i = 0; i < values.length; i++) {
+            total += values[i] - (i >= window ? values[i - window] : 0);
+            var count = Math.min(i + 1, window);
+            means[i] = count < minPeriods ? null : total / count;
+        }
+        return means;
+    }
+
+    function datesFrom(data, start, format) {
+        return Array.prototype.slice.call(data.dates, start).map(format);
+    }
+
+    function viralityPlot(data, countries, summary) {
+        var config = data.config;
+        var daily = dailyCases(data, summary.selection, summary.start);
+        var x = datesFrom(data, summary.start, isoDate);
+        var traces;
+        if (countries.length) {
+            traces = countries.map(function (country) {
+                var y = rollingMean(daily[country] || [], 7, 3);
+                return {type: 'scatter', x: x, y: y, name: country, customdata: y,
+                        hovertemplate: '%{customdata:.2s} cases', fill: 'tozeroy'};
+            });
+        } else {
+            var world = new Float64Array(x.length);
+            Object.keys(daily).forEach(function (state) {
+                daily[state].forEach(function (value, d) {
+                    world[d] += value;
+                });
+            });
+            traces = [{type: 'scatter', x: x, y: rollingMean(world, 7, 3),
+                       hovertemplate: '%{y:.2s} cases', marker: {color: config.blue},
+                       name: 'World Wide', fill: 'tozeroy'}];
+        }
+        return {data: traces, layout: {
+            template: config.template, hovermode: 'x', showlegend: false, margin: config.margin,
+            yaxis: {showgrid: false, nticks: 5, showticklabels: false, fixedrange: true},
+            xaxis: {showline: true, nticks: 5, showgrid: true, zeroline: false, fixedrange: true}
+        }};
+    }
+
+    function detailedPlot(data, countries, summary) {
+        var config = data.config;
+        if (countries.length) {
+            var traces = countries.map(function (country) {
+                var locations = [];
+                summary.selection.forEach(function (selected, l) {
+                    if (selected && data.states[l] === country) {
+                        locations.push(l);
+                    }
+                });
+                var x = [];
+                var y = [];
+                for (var d = summary.start; d < data.nDates; d++) {
+                    var total = 0;
+                    var found = false;
+                    locations.forEach(function (l) {
+                        var i = l * data.nDates + d;
+                        if (data.present[i]) {
+                            total += data.Confirmed[i];
+                            found = true;
+                        }
+                    });
+                    if (found) {
+                        x.push(longDate(data.dates[d]));
+                        y.push(total);
+                    }
+                }
+                return {type: 'scatter', x: x, y: y, hovertemplate: '%{y:.2s} cases', name: country};
+            });
+            return {data: traces, layout: {
+                template: config.template, hovermode: 'x', margin: config.margin, showlegend: false,
+                yaxis: {showline: true, nticks: 5, fixedrange: true},
+                xaxis: {showline: false, nticks: 5, showgrid: true, fixedrange: true}
+            }};
+        }
+
+        // nlargest then sort_values, both keep the ties in the order of the rows
+        var top10 = summary.rows.slice().sort(function (a, b) {
+            return b.Confirmed - a.Confirmed;
+        }).slice(0, 10).sort(function (a, b) {
+            return a.Confirmed - b.Confirmed;
+        });
+        var text = top10.map(function (row, i) {
+            return i >= top10.length - 3 ? prettify(row.Confirmed) : null;
+        });
+        var bar = {type: 'bar', orientation: 'h', textposition: 'auto'};
+        return {data: [
+            Object.assign({}, bar, {
+                x: top10.map(function (row) { return row.Confirmed; }),
+                y: top10.map(function (row) { return row.State; }),
+                text: text,
+                customdata: top10.map(function (row) { return row.Death / row.Confirmed * 100; }),
+                hovertemplate: '%{x:.3s} cases<extra>%{customdata:.1f}% deaths</extra>',
+                marker: {color: config.blue}
+            }),
+            Object.assign({}, bar, {
+                x: top10.map(function (row) { return row.Death; }),
+                y: top10.map(function (row) { return row.State; }),
+                hoverinfo: 'skip',
+                marker: {color: config.red}
+            })
+        ], layout: {
+            template: config.template, hovermode: 'y', showlegend: false, barmode: 'overlay',
+            margin: {l: 50, r: 20, t: 20, b: 20, pad: 10},
+            xaxis: {showgrid: false, showticklabels: false, zeroline: false, showline: false, fixedrange: true},
+            yaxis: {showgrid: false, showline: false, fixedrange: true}
+        }};
+    }
+
+    // Time-lapse of the map (helper/timelapse.py): the chunks of frames are decoded once and
+    // the sizes of a day are rebuilt from the first frame of its chunk and the changes since
+    var lapse = {version: null, meta: null, chunks: {}, wanted: null, day: null, sizes: null};
+
+    function lapseMeta(meta) {
+        if (lapse.version !== meta.version) {
+            lapse = {
+                version: meta.version, chunks: {}, wanted: null, day: null, sizes: null,
+                meta: {
+                    dates: typedArray(meta.dates),
+                    lat: Array.prototype.slice.call(typedArray(meta.lat)),
+                    lon: Array.prototype.slice.call(typedArray(meta.lon)),
+                    states: meta.states,
+                    chunkDays: meta.chunk_days,
+                    nChunks: meta.n_chunks,
+                    sizeref: meta.sizeref
+                }
+            };
+        }
+        return lapse.meta;
+    }
+
+    function decodeChunk(chunk) {
+        var counts = typedArray(chunk.counts);
+        var offsets = new Int32Array(counts.length + 1);
+        for (var d = 0; d < counts.length; d++) {
+            offsets[d + 1] = offsets[d] + counts[d];
+        }
+        return {
+            start: chunk.start, key: typedArray(chunk.key), offsets: offsets,
+            locations: typedArray(chunk.locations), sizes: typedArray(chunk.sizes)
+        };
+    }
+
+    function sizesOf(day) {
+        var chunk = lapse.chunks[Math.floor(day / lapse.meta.chunkDays)];
+        if (!chunk) {
+            return null;
+        }
+        if (lapse.day === day) {
+            return lapse.sizes;
+        }
+        // playing forward inside a chunk only applies the changes of the new days
+        var from = lapse.day !== null && lapse.day < day && lapse.day >= chunk.start ? lapse.day : chunk.start;
+        var sizes = from === chunk.start ? Uint8Array.from(chunk.key) : lapse.sizes;
+        for (var d = from + 1; d <= day; d++) {
+            var k = d - chunk.start - 1;
+            for (var i = chunk.offsets[k]; i < chunk.offsets[k + 1]; i++) {
+                sizes[chunk.locations[i]] = chunk.sizes[i];
+            }
+        }
+        lapse.day = day;
+        lapse.sizes = sizes;
+        return sizes;
+    }
+
+    window.dash_clientside.timelapse = {
+        // markers of the map for a frame, used by map.colorize
+        trace: function (frame) {
+            if (frame.version !== lapse.version) {
+                return null;
+            }
+            var sizes = sizesOf(frame.day);
+            if (!sizes) {
+                return null;
+            }
+            var meta = lapse.meta;
+            return {
+                lat: meta.lat, lon: meta.lon, text: meta.states, customdata: null,
+                marker: {
+                    size: Array.prototype.map.call(sizes, function (size) { return size * size; }),
+                    sizemode: 'area', sizemin: 2, sizeref: meta.sizeref
+                },
+                hovertemplate: '%{text}<extra></extra>'
+            };
+        },
+
+        toggle: function (nClicks) {
+            var playing = nClicks % 2 === 1;
+            return [!playing, playing ? '❚❚' : '▶'];
+        },
+
+        slider: function (meta) {
+            return meta ? lapseMeta(meta).dates.length - 1 : 0;
+        },
+
+        // next day of the playback, it starts over after the last one
+        advance: function (nIntervals, day, meta) {
+            if (!meta) {
+                return window.dash_clientside.no_update;
+            }
+            return day < lapseMeta(meta).dates.length - 1 ? day + 1 : 0;
+        },
+
+        // frame of the day, and the chunk to load: the one of the day, or the next one
+        // from the middle of the current chunk so that the playback doesn't wait
+        frame: function (day, chunk, meta) {
+            var noUpdate = window.dash_clientside.no_update;
+            if (!meta) {
+                return [null, noUpdate, ''];
+            }
+            var lapseData = lapseMeta(meta);
+            if (chunk && chunk.version === lapse.version && !(chunk.index in lapse.chunks)) {
+                lapse.chunks[chunk.index] = decodeChunk(chunk);
+            }
+            var last = lapseData.dates.length - 1;
+            if (day >= last) {
+                // the last frame is the map of all time
+                return [null, noUpdate, longDate(lapseData.dates[last])];
+            }
+            var index = Math.floor(day / lapseData.chunkDays);
+            var wanted = null;
+            if (!(index in lapse.chunks)) {
+                wanted = index;
+            } else if (day - index * lapseData.chunkDays >= lapseData.chunkDays / 2
+                       && index + 1 < lapseData.nChunks && !(index + 1 in lapse.chunks)) {
+                wanted = index + 1;
+            }
+            if (wanted !== null && wanted !== lapse.wanted) {
+                lapse.wanted = wanted;
+                wanted = {version: lapse.version, index: wanted};
+            } else {
+                wanted = noUpdate;
+            }
+            var frame = index in lapse.chunks ? {version: lapse.version, day: day} : noUpdate;
+            return [frame, wanted, longDate(lapseData.dates[day])];
+        },
+
+        // cursor of the playback day over the virality plot, the days after it are faded
+        cursor: function (base, frame) {
+            if (!base) {
+                return window.dash_clientside.no_update;
+            }
+            if (!frame || frame.version !== lapse.version) {
+                return base;
+            }
+            var dates = lapse.meta.dates;
+            var day = isoDate(dates[frame.day]);
+            var shapes = [
+                {type: 'line', xref: 'x', yref: 'paper', x0: day, x1: day, y0: 0, y1: 1,
+                 line: {color: '#6c757d', width: 1}},
+                {type: 'rect', xref: 'x', yref: 'paper', x0: day, x1: isoDate(dates[dates.length - 1]),
+                 y0: 0, y1: 1, fillcolor: '#FBFBFB', opacity: 0.7, line: {width: 0}}
+            ];
+            var layout = Object.assign({}, base.layout, {shapes: shapes});
+            return Object.assign({}, base, {layout: layout});
+        }
+    };
+
+    // helper/auto_zoom.zoom_and_center, the constants come with the dataset config
+    function worldY(lat, maxLatitude) {
+        lat = Math.max(-maxLatitude, Math.min(maxLatitude, lat)) * Math.PI / 180;
+        return (1 - Math.log(Math.tan(lat) + 1 / Math.cos(lat)) / Math.PI) / 2;
+    }
+
+    function zoomAndCenter(longitudes, latitudes, zoom) {
+        if (!longitudes.length) {
+            return [null, null];
+        }
+        // smallest arc containing the longitudes: it starts after their largest gap
+        var wrapped = longitudes.map(function (lon) { return ((lon + 180) % 360 + 360) % 360 - 180; });
+        wrapped = wrapped.filter(function (lon, i, all) { return all.indexOf(lon) === i; });
+        wrapped.sort(function (a, b) { return a - b; });
+        var n = wrapped.length;
+        var largest = 0;
+        var largestGap = -1;
+        wrapped.forEach(function (lon, i) {
+            var gap = i < n - 1 ? wrapped[i + 1] - lon : wrapped[0] + 360 - lon;
+            if (gap > largestGap) {
+                largest = i;
+                largestGap = gap;
+            }
+        });
+        var west = largest === n - 1 ? wrapped[0] : wrapped[largest + 1];
+        var east = largest === n - 1 ? wrapped[n - 1] : wrapped[largest] + 360;
+
+        var ySouth = worldY(Math.min.apply(null, latitudes), zoom.max_latitude);
+        var yNorth = worldY(Math.max.apply(null, latitudes), zoom.max_latitude);
+        var sizes = [(east - west) / 360, ySouth - yNorth];
+        var level = Math.min.apply(null, sizes.map(function (size, i) {
+            return Math.log2(zoom.padding * zoom.map_pixels[i] / zoom.tile_pixels / size);
+        }));
+        level = Math.max(zoom.min, Math.min(zoom.max, level));
+
+        var centerY = (ySouth + yNorth) / 2;
+        return [level, {
+            lon: (((west + east) / 2 + 180) % 360 + 360) % 360 - 180,
+            lat: Math.atan(Math.sinh(Math.PI * (1 - 2 * centerY))) * 180 / Math.PI
+        }];
+    }
+
+    window.dash_clientside.dataset = {
+        // app.build_map
+        map: function (store, timeRange) {
+            if (!store) {
+                return window.dash_clientside.no_update;
+            }
+            var data = decode(store);
+            var config = data.config;
+            var rows = summarize(data, null, timeRange).rows;
+            var size = rows.map(function (row) { return Math.max(row.Confirmed, 0); });
+            var figure = {
+                data: [{
+                    type: 'scattermapbox',
+                    lat: rows.map(function (row) { return data.lat[row.index]; }),
+                    lon: rows.map(function (row) { return data.long[row.index]; }),
+                    customdata: rows.map(function (row) { return [row.Confirmed, row.Death]; }),
+                    text: rows.map(function (row) { return row.State; }),
+                    marker: {
+                        color: config.blue, size: size, sizemode: 'area', sizemin: 2,
+                        sizeref: 2 * Math.max.apply(null, size) / (40 * 40)
+                    },
+                    hovertemplate: '%{customdata[0]:.3s} case<br>%{customdata[1]:.3s} deaths<extra> %{text}</extra>'
+                }],
+                layout: {template: config.template, margin: config.margin, mapbox: config.mapbox, showlegend: false}
+            };
+            return {figure: figure, palette: config.palette};
+        },
+
+        // app.focus_map
+        focus: function (store, countries) {
+            if (!store) {
+                return window.dash_clientside.no_update;
+            }
+            var data = decode(store);
+            // same sorted selection as the server
+            countries = (countries || []).filter(function (country, i, all) {
+                return all.indexOf(country) === i;
+            }).sort();
+            var selected = select(data, countries);
+            var longitudes = [];
+            var latitudes = [];
+            selected.forEach(function (isSelected, l) {
+                if (isSelected && data.located[l]) {
+                    longitudes.push(data.long[l]);
+                    latitudes.push(data.lat[l]);
+                }
+            });
+            var view = countries.length ? zoomAndCenter(longitudes, latitudes, data.config.zoom)
+                : [null, null];
+            return {zoom: view[0], center: view[1], revision: countries.join('|')};
+        },
+
+        // app.build_outputs
+        panels: function (store, countries, timeRange) {
+            if (!store) {
+                return [window.dash_clientside.no_update, window.dash_clientside.no_update,
+                        window.dash_clientside.no_update];
+            }
+            var data = decode(store);
+            // same sorted selection as the server
+            countries = (countries || []).filter(function (country, i, all) {
+                return all.indexOf(country) === i;
+            }).sort();
+            var summary = summarize(data, countries, timeRange);
+            var cases = 0;
+            var deaths = 0;
+            summary.rows.forEach(function (row) {
+                cases += row.Confirmed;
+                deaths += row.Death;
+            });
+            return [
+                '👉 **' + prettify(cases) + ' cases** & ' + prettify(deaths) + ' deaths',
+                viralityPlot(data, countries, summary),
+                detailedPlot(data, countries, summary)
+            ];
+        }
+    };
+})();
@@ -0,0 +1,163 @@
+"""Check that concurrent sessions never see each other's selection.
+
+    python -m benchmark.concurrency --workers 4 --threads 8 --sessions 64 --clicks 20
+    python -m benchmark.concurrency --url http://127.0.0.1:8050 --sessions 64
+
+The app is started with gunicorn (gthread workers) unless --url points to a
+running server. Every session clicks locations of the map in its own random
+order and sends the selection returned by map_selection back as the state of
+its next click, like the browser does, then asks the panel callbacks for the
+panels of its selection. A selection must be the toggles of the clicks of its own
+session, and the panels must be the ones of a request made alone for the same
+selection. Any mismatch makes the run fail.
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# panel callbacks of app.py: output, stage it waits for (Container.gate), lazy
+PANELS = [('one_line_report.children', None, False), ('virality_base.data', 'loaded_0', False),
+          ('detailed_plot.figure', 'detailed_plot_ready', True)]
+
+
+def post(url, body):
+    request = urllib.request.Request(
+        f'{url}/_dash-update-component', data=json.dumps(body).encode(),
+        headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=60) as response:
+        return json.loads(response.read() or 'null')
+
+
+def click(url, location, selection):
+    body = {
+        'output': 'country_dropdown.value',
+        'outputs': {'id': 'country_dropdown', 'property': 'value'},
+        'inputs': [{'id': 'maps', 'property': 'clickData', 'value': {'points': [{'text': location}]}},
+                   {'id': 'maps', 'property': 'selectedData', 'value': None}],
+        'state': [{'id': 'country_dropdown', 'property': 'value', 'value': selection}],
+        'changedPropIds': ['maps.clickData'],
+    }
+    return post(url, body)['response']['country_dropdown']['value']
+
+
+def panels(url, selection, time_range=0):
+    """Outputs of the panels of a selection, the detailed plot as once scrolled into view"""
+    values = [{'id': 'country_dropdown', 'property': 'value', 'value': selection},
+              {'id': 'time_dropdown', 'property': 'value', 'value': time_range}]
+    outputs = {}
+    for output, gate, lazy in PANELS:
+        component, prop = output.split('.')
+        gates = [{'id': gate, 'property': 'data', 'value': 1}] if gate else []
+        # a lazy panel gets the selection as states, its gate is its only input
+        inputs, state = (gates, values) if lazy else (values + gates, [])
+        body = {'output': output, 'outputs': {'id': component, 'property': prop},
+                'inputs': inputs, 'state': state,
+                'changedPropIds': [f"{inputs[0]['id']}.{inputs[0]['property']}"]}
+        outputs.update(post(url, body)['response'])
+    return outputs
+
+
+def locations_of(url):
+    """Options of the country dropdown"""
+    with urllib.request.urlopen(f'{url}/_dash-layout', timeout=60) as response:
+        layout = json.loads(response.read())
+    found = []
+
+    def walk(node):
+        if isinstance(node, dict):
+            if node.get('props', {}).get('id') == 'country_dropdown':
+                found.extend(option['value'] for option in node['props']['options'])
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+    walk(layout)
+    return found
+
+
+def run_session(url, locations, clicks, seed):
+    """Clicks of one session, returns the number of requests and the mismatches"""
+    rng = random.Random(seed)
+    selection, expected = None, []
+    mismatches = []
+    for _ in range(clicks):
+        location = rng.choice(locations)
+        expected = ([country for country in expected if country != location]
+                    if location in expected else expected + [location])
+        selection = click(url, location, selection)
+        if (selection or []) != expected:
+            mismatches.append({'session': seed, 'expected': expected, 'received': selection})
+    return clicks, mismatches, sorted(expected)
+
+
+def start_server(workers, threads):
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    process = subprocess.Popen(
+        ['gunicorn', 'app:server', '--workers', str(workers), '--threads', str(threads),
+         '--worker-class', 'gthread', '--bind', f'127.0.0.1:{port}'], cwd=ROOT)
+    url = f'http://127.0.0.1:{port}'
+    for _ in range(120):
+        try:
+            urllib.request.urlopen(url, timeout=1).close()
+            return process, url
+        except OSError:
+            time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError('gunicorn did not start')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--url', help='running server, gunicorn is started otherwise')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--sessions', type=int, default=64)
+    parser.add_argument('--clicks', type=int, default=20)
+    parser.add_argument('--locations', type=int, default=8,
+                        help='number of locations clicked, few locations give more toggles')
+    args = parser.parse_args(argv)
+
+    process, url = (None, args.url) if args.url else start_server(args.workers, args.threads)
+    try:
+        locations = locations_of(url)[:args.locations]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+            sessions = list(pool.map(lambda seed: run_session(url, locations, args.clicks, seed),
+                                     range(args.sessions)))
+            selections = sorted({tuple(selection) for _, _, selection in sessions})
+            concurrent = list(pool.map(lambda selection: panels(url, list(selection)),
+                                       selections * 4))
+        elapsed = time.perf_counter() - start
+
+        # the panels of every selection, requested one at a time
+        reference = {selection: panels(url, list(selection)) for selection in selections}
+        mismatches = [mismatch for _, session_mismatches, _ in sessions for mismatch in session_mismatches]
+        mismatches += [{'selection': selection} for selection, response
+                       in zip(selections * 4, concurrent) if response != reference[selection]]
+        requests = sum(count for count, _, _ in sessions) + len(concurrent)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    report = {'url': url, 'sessions': args.sessions, 'requests': requests,
+              'requests_per_second': requests / elapsed, 'mismatches': len(mismatches)}
+    print(json.dumps(report, indent=2))
+    for mismatch in mismatches[:10]:
+        print(f'mismatch: {mismatch}', file=sys.stderr)
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
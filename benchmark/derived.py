@@ -0,0 +1,161 @@
+"""Parity of the derived series (helper/derived.py) with the functions computing them
+on every request, and the time they save.
+
+    python -m benchmark.derived
+    python -m benchmark.derived --locations 1000 --days 1000 --repeat 5
+
+The synthetic dataset has gaps: some rows are dropped, a few locations stop
+before the last day (their selections don't share the window of the preset)
+and some States have several locations. For every time range of the dropdown,
+one that is not a preset, and several selections, the derived views must be
+equal to:
+    * summarize: sumurize_by_country(filter_df(data, countries, time_range))
+    * daily_cases: get_daily_case(filter_df(data, countries, time_range)) summed by
+      Date and State, 0 on the days without a row for the selection
+    * world: get_daily_case(filter_df(data, None, time_range)) summed by Date, with
+      its rolling(7, min_periods=3).mean()
+    * top10: the top 10 of the summary, as built by global_update before
+Any difference makes the run fail.
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmark.synthetic import synthetic_dataset
+from helper.cube import Cube
+from helper.data_model import CompactData
+from helper.data_preparation import filter_df, get_daily_case, sumurize_by_country
+from helper.derived import PRESETS, Derived
+from helper.utils import prettify_number
+
+TIME_RANGES = PRESETS + [7]
+
+
+def dataset_with_gaps(n_locations, n_days, seed=0):
+    rng = np.random.default_rng(seed)
+    df = synthetic_dataset(n_locations, n_days, seed)
+    # every 10th location shares the State of the previous one
+    states = df['State'].to_numpy().copy()
+    location = np.repeat(np.arange(n_locations), n_days)
+    shared = location % 10 == 1
+    states[shared] = [f'Location {i - 1}' for i in location[shared]]
+    df['State'] = states
+    day = np.tile(np.arange(n_days), n_locations)
+    keep = rng.random(len(df)) > 0.01
+    # a few locations stop a month before the last day
+    keep &= ~((location % 17 == 3) & (day >= n_days - 30))
+    return df[keep].reset_index(drop=True)
+
+
+def expected_top10(summary):
+    # build_outputs before the derived series
+    top10 = summary.nlargest(10, 'Confirmed')
+    top10.sort_values('Confirmed', inplace=True)
+    keep_top_3 = [None] * len(top10)
+    keep_top_3[-3:] = top10['Confirmed'][-3:]
+    keep_top_3 = [prettify_number(x) for x in keep_top_3]
+    return top10[['State', 'Confirmed', 'Death']], keep_top_3, (top10['Death']/top10['Confirmed'])*100
+
+
+def expected_daily_cases(data, countries, time_range):
+    # virality_plot before the derived series, summed over the locations of a State
+    return get_daily_case(filter_df(data, countries, time_range)).groupby(['Date', 'State']).sum().unstack(fill_value=0)
+
+
+def expected_world(data, time_range):
+    return get_daily_case(filter_df(data, None, time_range)).groupby('Date').sum().rolling(7, min_periods=3).mean()
+
+
+def check(data, cube, derived, selections):
+    mismatches = []
+
+    def compare(name, countries, time_range, left, right):
+        try:
+            if isinstance(left, pd.DataFrame):
+                pd.testing.assert_frame_equal(left, right, check_dtype=False)
+            else:
+                pd.testing.assert_series_equal(left, right, check_dtype=False, check_names=False)
+        except AssertionError as error:
+            mismatches.append({'view': name, 'countries': countries, 'time_range': time_range,
+                               'error': str(error).splitlines()[0]})
+
+    for time_range in TIME_RANGES:
+        for countries in selections:
+            reference = sumurize_by_country(filter_df(data, countries, time_range))
+            compare('summarize', countries, time_range, derived.summarize(countries, time_range), reference)
+            daily_cases = derived.daily_cases(countries, time_range)
+            compare('daily_cases', countries, time_range, daily_cases,
+                    expected_daily_cases(data, countries, time_range).reindex(
+                        index=daily_cases.index, columns=daily_cases.columns, fill_value=0))
+            compare('Cube.daily_cases', countries, time_range, cube.daily_cases(countries, time_range), daily_cases)
+        compare('world', None, time_range, derived.world(time_range), expected_world(data, time_range))
+        top10, labels, rates = expected_top10(cube.summarize(None, time_range))
+        derived_top10 = derived.top10(time_range)
+        compare('top10', None, time_range, derived_top10[['State', 'Confirmed', 'Death']], top10)
+        compare('top10.death_rate', None, time_range, derived_top10['death_rate'], rates)
+        if derived_top10['label'].tolist() != labels:
+            mismatches.append({'view': 'top10.label', 'time_range': time_range})
+    return mismatches
+
+
+def seconds(function, repeat):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--locations', type=int, default=280)
+    parser.add_argument('--days', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    data = CompactData.from_long(dataset_with_gaps(args.locations, args.days))
+    cube = Cube(data)
+    start = time.perf_counter()
+    derived = Derived(cube)
+    build_seconds = time.perf_counter() - start
+
+    states = sorted(set(cube.states))
+    selections = [None, states[:1], states[:5], states[3:40:3], ['Location 3'], ['Location 3', 'Location 20']]
+    mismatches = check(data, cube, derived, selections)
+
+    # the worldwide views of a time range, computed again or looked up
+    def on_the_fly(time_range):
+        summary = sumurize_by_country(filter_df(data, None, time_range))
+        expected_world(data, time_range)
+        expected_top10(summary)
+
+    def looked_up(time_range):
+        derived.summarize(None, time_range)
+        derived.world(time_range)
+        derived.top10(time_range)
+
+    report = {
+        'locations': args.locations, 'days': args.days,
+        'derived_seconds': build_seconds,
+        'derived_bytes': int(derived.daily.nbytes + sum(
+            summary.memory_usage(deep=True).sum() for summary in derived.summaries.values())),
+        'worldwide_view_seconds': {
+            str(time_range): {'on_the_fly': seconds(lambda: on_the_fly(time_range), args.repeat),
+                              'derived': seconds(lambda: looked_up(time_range), args.repeat)}
+            for time_range in PRESETS},
+        'mismatches': len(mismatches),
+    }
+    print(json.dumps(report, indent=2))
+    for mismatch in mismatches[:10]:
+        print(f'mismatch: {mismatch}', file=sys.stderr)
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
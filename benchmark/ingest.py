@@ -0,0 +1,56 @@
+"""Ingest time of a full collect_data against an incremental one as the history grows.
+
+    python -m benchmark.ingest [n_locations]
+
+For every history length the stored dataset holds all the days but the last
+one, the incremental run only processes the new day.
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+from benchmark.synthetic import synthetic_source
+from data.collect_data import collect_data
+
+HISTORY = [100, 250, 500, 1000]
+# only the confirmed and death series
+GLOBAL_ONLY = {'url_recovered': None, 'url_us_confirmed': None, 'url_us_death': None}
+
+
+def timed(*args, **kwargs):
+    start = time.perf_counter()
+    collect_data(*args, **kwargs, **GLOBAL_ONLY)
+    return time.perf_counter() - start
+
+
+def run(n_locations=280):
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for n_days in HISTORY:
+            sources = {}
+            for name, metric in (('confirmed', 'Confirmed'), ('death', 'Death')):
+                df = synthetic_source(n_locations, n_days, metric)
+                sources[name] = os.path.join(directory, f'{name}.csv')
+                df.to_csv(sources[name], index=False)
+                df.iloc[:, :-1].to_csv(os.path.join(directory, f'{name}_previous.csv'), index=False)
+
+            full = timed(os.path.join(directory, 'full.csv'),
+                         sources['confirmed'], sources['death'])
+
+            saving_path = os.path.join(directory, 'incremental.csv')
+            collect_data(saving_path, os.path.join(directory, 'confirmed_previous.csv'),
+                         os.path.join(directory, 'death_previous.csv'), **GLOBAL_ONLY)
+            incremental = timed(saving_path, sources['confirmed'], sources['death'],
+                                incremental=True)
+            unchanged = timed(saving_path, sources['confirmed'], sources['death'],
+                              incremental=True)
+
+            results.append({'locations': n_locations, 'days': n_days, 'full_seconds': full,
+                            'incremental_seconds': incremental, 'unchanged_seconds': unchanged})
+    return results
+
+
+if __name__ == '__main__':
+    print(json.dumps(run(*[int(arg) for arg in sys.argv[1:2]]), indent=2))
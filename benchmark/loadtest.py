@@ -0,0 +1,436 @@
+"""Load test of app:server with simulated dashboard sessions, fully offline.
+
+    python -m benchmark.loadtest --users 1 4 16 64 --duration 30
+    python -m benchmark.loadtest --server flask --locations 1000 --days 1000 --max-p95-ms 500
+    python -m benchmark.loadtest --url http://127.0.0.1:8050 --users 8
+
+The server is started on a synthetic dataset in a temporary directory (gunicorn
+with gthread workers when it is installed, the threaded Flask server
+otherwise) unless --url points to a running one. The data file is fresh and
+the sources point to the empty directory, so the app never downloads.
+
+Every virtual user replays sessions like a browser, one request at a time: it
+loads the page and its layout, runs the first callbacks by priority (the
+counter and focus_map, then update_map and the virality plot), then a few
+actions drawn at random: a new time range (time_dropdown), a multi selection
+in country_dropdown, a click or a box selection on the map (clickData /
+selectedData of map_selection), or a scroll down to the detailed plot, which is
+only requested once scrolled into view. Every action sends the callbacks the
+browser chains after it, with the outputs of the previous ones as their state.
+The number of users is ramped up level by level, each level runs for
+--duration seconds.
+
+For every level the report has the throughput, the p50/p95/p99 latency and
+the errors of every callback, and the CPU (percent of one core) and the RSS
+of the server processes (Linux /proc, the RSS of the workers is summed, so
+pages shared with the master are counted once per process). Two more entries
+time the page load from its first request: `first_output` until the counter,
+the first meaningful output, and `above_the_fold` until the map and the
+virality plot. The run fails when a request fails or, with --max-p95-ms, when
+a callback is slower at p95.
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmark.concurrency import locations_of
+from benchmark.synthetic import synthetic_dataset
+from data.collect_data import save_columnar
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TIME_RANGES = [0, 90, 30, 15]
+# weights of the actions of a session
+ACTIONS = {'time_range': 3, 'countries': 3, 'click': 3, 'select': 1, 'scroll': 1}
+# timings of the page load, not of a request
+PAGE_LOAD = ['first_output', 'above_the_fold']
+FLASK_SERVER = '''
+import sys
+sys.path.insert(0, sys.argv[1])
+import app
+app.server.run(host='127.0.0.1', port=int(sys.argv[2]), threaded=True)
+'''
+
+
+class Session:
+    """
+        >> ATTRIBUTES <<
+        ---------------------------------------------------------------------------------------------
+            * url: server
+            * locations: options of the country dropdown
+            * record: record(name, seconds, ok) of every request
+            * rng: random.Random of the session
+
+        >> OUTPUT <<
+        -------------------------------------------------------
+        State of one browser tab: the values of the dropdowns and the stores the callbacks
+        read back (map_focus, map_view), updated from their responses.
+    """
+
+    def __init__(self, url, locations, record, rng):
+        self.url = url
+        self.locations = locations
+        self.record = record
+        self.rng = rng
+        self.selection = None
+        self.time_range = 0
+        self.focus = None
+        self.view = None
+        # stage store of the tab (cards.loaded): grows with every report the tab gets
+        self.stage = 0
+        # the detailed plot was scrolled into view
+        self.scrolled = False
+
+    def request(self, name, path, body=None):
+        """Response of the request, None when it failed"""
+        data = None if body is None else json.dumps(body).encode()
+        request = urllib.request.Request(
+            f'{self.url}{path}', data=data,
+            headers={'Content-Type': 'application/json', 'Accept-Encoding': 'gzip'})
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                content = response.read()
+                if response.headers.get('Content-Encoding') == 'gzip':
+                    content = gzip.decompress(content)
+                status = response.status
+        except OSError:
+            self.record(name, time.perf_counter() - start, False)
+            return None
+        self.record(name, time.perf_counter() - start, True)
+        # 204: PreventUpdate
+        return json.loads(content) if status == 200 and body is not None else {}
+
+    def callback(self, name, outputs, inputs, state=(), changed=None):
+        single = len(outputs) == 1
+        body = {
+            'output': (f"{outputs[0][0]}.{outputs[0][1]}" if single
+                       else '..' + '...'.join(f'{id}.{prop}' for id, prop in outputs) + '..'),
+            'outputs': ({'id': outputs[0][0], 'property': outputs[0][1]} if single
+                        else [{'id': id, 'property': prop} for id, prop in outputs]),
+            'inputs': [{'id': id, 'property': prop, 'value': value} for id, prop, value in inputs],
+            'state': [{'id': id, 'property': prop, 'value': value} for id, prop, value in state],
+            'changedPropIds': changed or [f'{inputs[0][0]}.{inputs[0][1]}'],
+        }
+        response = self.request(name, '/_dash-update-component', body)
+        return None if response is None else response.get('response', {})
+
+    def panel_values(self):
+        return [('country_dropdown', 'value', self.selection), ('time_dropdown', 'value', self.time_range)]
+
+    def report(self):
+        response = self.callback('update_report', [('one_line_report', 'children')], self.panel_values())
+        self.stage += 1
+        return response
+
+    def virality(self):
+        self.callback('update_virality', [('virality_base', 'data')],
+                      self.panel_values() + [('loaded_0', 'data', self.stage)])
+
+    def detailed(self):
+        # the selection is a state of the lazy card, its ready store its only input
+        self.callback('update_detailed', [('detailed_plot', 'figure')],
+                      [('detailed_plot_ready', 'data', self.stage)], self.panel_values())
+
+    def panels(self):
+        """The panels of a new selection or time range, by priority"""
+        self.report()
+        self.virality()
+        if self.scrolled:
+            self.detailed()
+
+    def update_map(self, changed):
+        response = self.callback('update_map', [('map_base', 'data'), ('map_view', 'data')],
+                                 [('time_dropdown', 'value', self.time_range), ('maps', 'relayoutData', None),
+                                  ('map_focus', 'data', self.focus), ('loaded_0', 'data', self.stage)],
+                                 [('map_view', 'data', self.view)], changed=[changed])
+        if response and 'map_view' in response:
+            self.view = response['map_view']['data']
+
+    def focus_map(self):
+        response = self.callback('focus_map', [('map_focus', 'data')],
+                                 [('country_dropdown', 'value', self.selection)])
+        if response and 'map_focus' in response:
+            self.focus = response['map_focus']['data']
+            # the map zooms on the new selection
+            self.update_map('map_focus.data')
+
+    def new_selection(self, selection):
+        self.selection = selection
+        self.panels()
+        self.focus_map()
+
+    def map_selection(self, click=None, selected=None):
+        trigger = 'maps.clickData' if click else 'maps.selectedData'
+        response = self.callback('map_selection', [('country_dropdown', 'value')],
+                                 [('maps', 'clickData', click), ('maps', 'selectedData', selected)],
+                                 [('country_dropdown', 'value', self.selection)], changed=[trigger])
+        if response and 'country_dropdown' in response:
+            self.new_selection(response['country_dropdown']['value'])
+
+    def open(self):
+        start = time.perf_counter()
+        self.request('page', '/')
+        self.request('layout', '/_dash-layout')
+        self.request('dependencies', '/_dash-dependencies')
+        self.record('first_output', time.perf_counter() - start, self.report() is not None)
+        response = self.callback('focus_map', [('map_focus', 'data')],
+                                 [('country_dropdown', 'value', self.selection)])
+        if response and 'map_focus' in response:
+            self.focus = response['map_focus']['data']
+        self.update_map('time_dropdown.value')
+        self.virality()
+        self.record('above_the_fold', time.perf_counter() - start, True)
+
+    def act(self, action):
+        if action == 'time_range':
+            self.time_range = self.rng.choice([value for value in TIME_RANGES if value != self.time_range])
+            self.panels()
+            self.update_map('time_dropdown.value')
+        elif action == 'countries':
+            self.new_selection(self.rng.sample(self.locations, self.rng.randint(1, min(5, len(self.locations)))))
+        elif action == 'scroll':
+            if not self.scrolled:
+                self.scrolled = True
+                self.detailed()
+        elif action == 'click':
+            self.map_selection(click={'points': [{'text': self.rng.choice(self.locations)}]})
+        else:
+            points = self.rng.sample(self.locations, self.rng.randint(2, min(20, len(self.locations))))
+            self.map_selection(selected={'points': [{'text': location} for location in points]})
+
+
+def run_user(url, locations, record, deadline, actions, think, seed):
+    """Sessions of one virtual user until the deadline"""
+    rng = random.Random(seed)
+    names, weights = list(ACTIONS), list(ACTIONS.values())
+    while time.perf_counter() < deadline:
+        session = Session(url, locations, record, rng)
+        session.open()
+        for action in rng.choices(names, weights, k=actions):
+            if time.perf_counter() >= deadline:
+                return
+            time.sleep(rng.uniform(0, think))
+            session.act(action)
+
+
+def process_tree(pid):
+    """pid and its descendants"""
+    parents = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    # the command name may contain spaces, the fields after it don't
+                    parents[int(entry)] = int(f.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, IndexError):
+                pass
+    tree, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        tree.append(current)
+        stack.extend(child for child, parent in parents.items() if parent == current)
+    return tree
+
+
+def process_usage(pid):
+    """(cpu seconds, rss bytes) of a process, None when it is gone"""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+    except OSError:
+        return None
+    # utime and stime are the fields 14 and 15 of stat, rss (pages) is the field 24
+    cpu = (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    return cpu, int(fields[21]) * os.sysconf('SC_PAGE_SIZE')
+
+
+class UsageSampler:
+    """
+        >> ATTRIBUTES <<
+        ---------------------------------------------------------------------------------------------
+            * pid: server process, its workers are found from it
+            * every: seconds between two samples
+
+        >> OUTPUT <<
+        -------------------------------------------------------
+        CPU seconds and peak RSS of the server processes between start() and stop(), sampled
+        in a background thread. Without a pid (--url) nothing is measured.
+    """
+
+    def __init__(self, pid, every=0.25):
+        self.pid = pid
+        self.every = every
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        cpu, rss = {}, 0
+        for pid in process_tree(self.pid):
+            usage = process_usage(pid)
+            if usage is not None:
+                cpu[pid] = usage[0]
+                rss += usage[1]
+        return cpu, rss
+
+    def _run(self):
+        while not self._stop.wait(self.every):
+            cpu, rss = self.sample()
+            self.cpu.update(cpu)
+            self.peak_rss = max(self.peak_rss, rss)
+
+    def start(self):
+        if self.pid is not None:
+            self.start_cpu, self.peak_rss = self.sample()
+            self.cpu = dict(self.start_cpu)
+            self.started = time.perf_counter()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self.pid is None:
+            return {}
+        self._stop.set()
+        self._thread.join()
+        cpu, rss = self.sample()
+        self.cpu.update(cpu)
+        seconds = sum(self.cpu[pid] - self.start_cpu.get(pid, 0) for pid in self.cpu)
+        return {'cpu_percent': 100 * seconds / (time.perf_counter() - self.started),
+                'peak_rss_mb': max(self.peak_rss, rss) / 2 ** 20, 'processes': len(cpu)}
+
+
+def latency_report(records, elapsed):
+    report = {}
+    for name, values in sorted(records.items()):
+        seconds = np.array([value for value, ok in values if ok])
+        p50, p95, p99 = np.percentile(seconds, [50, 95, 99]) * 1000 if len(seconds) else (None,) * 3
+        report[name] = {'requests': len(values), 'errors': sum(not ok for _, ok in values),
+                        'requests_per_second': len(values) / elapsed,
+                        'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99}
+    return report
+
+
+def run_level(url, locations, users, duration, actions, think, pid):
+    records = defaultdict(list)
+    lock = threading.Lock()
+
+    def record(name, seconds, ok):
+        with lock:
+            records[name].append((seconds, ok))
+
+    sampler = UsageSampler(pid).start()
+    start = time.perf_counter()
+    deadline = start + duration
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        list(pool.map(lambda seed: run_user(url, locations, record, deadline, actions, think, seed),
+                      range(users)))
+    elapsed = time.perf_counter() - start
+    callbacks = latency_report(records, elapsed)
+    return dict({'users': users, 'seconds': elapsed,
+                 'requests_per_second': sum(len(values) for values in records.values()) / elapsed,
+                 'errors': sum(callback['errors'] for callback in callbacks.values()),
+                 'callbacks': callbacks}, **sampler.stop())
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(server, directory, workers, threads):
+    port = free_port()
+    # the data file is fresh: nothing is due, and a collection would only read this directory
+    env = dict(os.environ, DATA_SOURCE_DIR=directory, THREADS=str(threads))
+    if server == 'gunicorn':
+        command = ['gunicorn', 'app:server', '--pythonpath', ROOT, '--config', os.path.join(ROOT, 'gunicorn.conf.py'),
+                   '--workers', str(workers), '--bind', f'127.0.0.1:{port}']
+    else:
+        command = [sys.executable, '-c', FLASK_SERVER, ROOT, str(port)]
+    process = subprocess.Popen(command, cwd=directory, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f'http://127.0.0.1:{port}'
+    for _ in range(600):
+        try:
+            urllib.request.urlopen(f'{url}/_dash-layout', timeout=1).close()
+            return process, url
+        except OSError:
+            if process.poll() is not None:
+                break
+            time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError(f'{server} did not start')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--url', help='running server, one is started otherwise')
+    parser.add_argument('--server', choices=['gunicorn', 'flask'],
+                        default='gunicorn' if shutil.which('gunicorn') else 'flask')
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn workers')
+    parser.add_argument('--threads', type=int, default=4, help='threads per gunicorn worker')
+    parser.add_argument('--locations', type=int, default=280)
+    parser.add_argument('--days', type=int, default=1000)
+    parser.add_argument('--users', type=int, nargs='+', default=[1, 4, 16, 64],
+                        help='concurrent users of every level of the ramp')
+    parser.add_argument('--duration', type=float, default=30, help='seconds per level')
+    parser.add_argument('--actions', type=int, default=10, help='actions per session after the page load')
+    parser.add_argument('--think', type=float, default=0.0, help='maximum pause before an action, seconds')
+    parser.add_argument('--max-p95-ms', type=float, default=None)
+    parser.add_argument('--output', help='also write the report to this file')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        process, url = None, args.url
+        if url is None:
+            os.makedirs(os.path.join(directory, 'data'))
+            csv_path = os.path.join(directory, 'data', 'spreading_covid19.csv')
+            df = synthetic_dataset(args.locations, args.days)
+            df.to_csv(csv_path, index=False)
+            save_columnar(df, csv_path)
+            process, url = start_server(args.server, directory, args.workers, args.threads)
+        try:
+            locations = locations_of(url)
+            levels = [run_level(url, locations, users, args.duration, args.actions, args.think,
+                                None if process is None else process.pid)
+                      for users in args.users]
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+    report = {'url': args.url or args.server, 'locations': len(locations), 'levels': levels}
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    failures = [f"{level['errors']} failed requests with {level['users']} users"
+                for level in levels if level['errors']]
+    if args.max_p95_ms is not None:
+        failures += [f"{name} p95 {callback['p95_ms']:.0f} ms with {level['users']} users"
+                     for level in levels for name, callback in level['callbacks'].items()
+                     if name not in PAGE_LOAD and callback['p95_ms'] is not None
+                     and callback['p95_ms'] > args.max_p95_ms]
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
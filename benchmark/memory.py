@@ -0,0 +1,65 @@
+"""Memory of the long dataset against the compact model (CompactData) and the Cube.
+
+    python -m benchmark.memory
+    python -m benchmark.memory --sizes 280x1143 5000x1143
+
+Every size is a synthetic dataset of locations x days, 280 x 1143 is the JHU
+global series up to its last day. The long frame is read back from its CSV
+(object State strings, float64 coordinates and int64 counts on every row);
+the bytes are pandas deep memory usage.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from benchmark.synthetic import synthetic_dataset
+from helper.cube import Cube
+from helper.data_model import CompactData
+from helper.dataset import read_dataset
+
+SIZES = ['280x1143', '5000x1143']
+
+
+def cube_bytes(cube):
+    return int(cube.values.nbytes + cube.present.nbytes + cube.dates.nbytes
+               + cube.locations.memory_usage(index=True, deep=True).sum())
+
+
+def report_size(n_locations, n_days):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'spreading_covid19.csv')
+        synthetic_dataset(n_locations, n_days).to_csv(path, index=False)
+        df = read_dataset(path)
+
+    start = time.perf_counter()
+    data = CompactData.from_long(df)
+    seconds = time.perf_counter() - start
+    long_bytes = {column: int(size) for column, size
+                  in df.memory_usage(index=True, deep=True).items()}
+    compact = data.memory_usage()
+    return {
+        'locations': n_locations,
+        'days': n_days,
+        'rows': len(df),
+        'long_bytes': sum(long_bytes.values()),
+        'long_bytes_by_column': long_bytes,
+        'compact_bytes': sum(compact.values()),
+        'compact_bytes_by_table': compact,
+        'ratio': sum(long_bytes.values()) / sum(compact.values()),
+        'from_long_seconds': seconds,
+        'cube_bytes': cube_bytes(Cube(data)),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', nargs='+', default=SIZES, help='locations x days')
+    args = parser.parse_args(argv)
+    sizes = [tuple(int(n) for n in size.split('x')) for size in args.sizes]
+    print(json.dumps([report_size(*size) for size in sizes], indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""Memory of the workers forked from a preloaded master, against workers loading on their own.
+
+    python -m benchmark.preload --workers 4 --locations 1000 --days 1000
+    python -m benchmark.preload --max-private-mb 40
+
+The app runs on a synthetic dataset in a temporary directory. A master process
+forks the workers like gunicorn: with `preload` it imports the app, loads the
+dataset and freezes the collector first (when_ready of gunicorn.conf.py, with
+PRELOAD=1); with `fork` every worker imports the app itself; `refreshed` is
+`preload` after a refresh: the data file is replaced and the master loads the
+new version as on the SIGHUP sent by the worker that collected it (on_reload),
+then forks new workers. Each worker then serves the default view and a few
+selections, and the master reads the /proc/<pid>/smaps_rollup (Linux) of every
+live worker: `pss` splits the shared pages between the processes sharing them,
+`private` is the memory only this worker holds. The run fails when a preloaded
+or refreshed worker holds more than --max-private-mb of private memory or more
+than a worker loading on its own, or when a refreshed worker doesn't serve the
+new version from the master.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from benchmark.synthetic import synthetic_dataset
+from data.collect_data import save_columnar
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# flask-caching directory of the app, relative to its working directory
+CACHE_DIR = 'cache-directory'
+
+MASTER = '''
+import json, os, runpy, sys
+sys.path.insert(0, sys.argv[3])
+mode, workers = sys.argv[1], int(sys.argv[2])
+
+def memory(pid):
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                values[parts[0].rstrip(':')] = int(parts[1])
+    return {'rss_kb': values['Rss'], 'pss_kb': values['Pss'],
+            'private_kb': values['Private_Clean'] + values['Private_Dirty']}
+
+if mode in ('preload', 'refreshed'):
+    # the hooks of the gunicorn master
+    os.environ['PRELOAD'] = '1'
+    conf = runpy.run_path(os.path.join(sys.argv[3], 'gunicorn.conf.py'))
+    import app
+    conf['when_ready'](None)
+if mode == 'refreshed':
+    # the files written by collect_data, then the SIGHUP of the worker
+    for name in os.listdir('refresh'):
+        os.replace(os.path.join('refresh', name), os.path.join('data', name))
+    conf['on_reload'](None)
+
+workers_pids, ready = [], []
+for _ in range(workers):
+    ready_read, ready_write = os.pipe()
+    exit_read, exit_write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        import app
+        countries = app.countries[:5]
+        with app.server.test_request_context():
+            app.update_map(0, None, None, None)
+            app.global_update(None, 0)
+            app.global_update(countries, 30)
+            app.focus_map(countries)
+            version = app.dataset.get().version
+        # a worker still reloading on its own would hold a private copy
+        os.write(ready_write, f'{version} {int(app.dataset.changed())}'.encode())
+        os.read(exit_read, 1)
+        os._exit(0)
+    workers_pids.append((pid, exit_write))
+    ready.append(ready_read)
+
+served = [os.read(fd, 64).decode().split() for fd in ready]
+report = {'master': memory(os.getpid()), 'workers': [memory(pid) for pid, _ in workers_pids],
+          'master_version': None if mode == 'fork' else app.dataset.get().version,
+          'worker_versions': [version for version, _ in served],
+          'workers_reloading': sum(int(changed) for _, changed in served)}
+for pid, exit_write in workers_pids:
+    os.write(exit_write, b'1')
+    os.waitpid(pid, 0)
+print(json.dumps(report))
+'''
+
+
+def run_mode(mode, workers, directory):
+    # every mode computes the same outputs, none is served from the shared cache of another
+    shutil.rmtree(os.path.join(directory, CACHE_DIR), ignore_errors=True)
+    output = subprocess.run([sys.executable, '-c', MASTER, mode, str(workers), ROOT],
+                            cwd=directory, check=True, capture_output=True, text=True).stdout
+    report = json.loads(output.strip().splitlines()[-1])
+    report['worker_mean_kb'] = {name: statistics.mean(worker[name] for worker in report['workers'])
+                                for name in ('rss_kb', 'pss_kb', 'private_kb')}
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--locations', type=int, default=1000)
+    parser.add_argument('--days', type=int, default=1000)
+    parser.add_argument('--max-private-mb', type=float, default=None)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.makedirs(os.path.join(directory, 'data'))
+        csv_path = os.path.join(directory, 'data', 'spreading_covid19.csv')
+        df = synthetic_dataset(args.locations, args.days)
+        df.to_csv(csv_path, index=False)
+        save_columnar(df, csv_path)
+        # the first boot writes the startup snapshot of the dataset
+        run_mode('fork', 1, directory)
+        report = {mode: run_mode(mode, args.workers, directory) for mode in ('fork', 'preload')}
+        # the next day of the dataset, as written by a refresh
+        os.makedirs(os.path.join(directory, 'refresh'))
+        refreshed = synthetic_dataset(args.locations, args.days + 1)
+        refreshed.to_csv(os.path.join(directory, 'refresh', 'spreading_covid19.csv'), index=False)
+        save_columnar(refreshed, os.path.join(directory, 'refresh', 'spreading_covid19.csv'))
+        report['refreshed'] = run_mode('refreshed', args.workers, directory)
+    print(json.dumps({mode: {'master_kb': result['master'], 'worker_mean_kb': result['worker_mean_kb']}
+                      for mode, result in report.items()}, indent=2))
+
+    failures = []
+    for mode in ('preload', 'refreshed'):
+        private = report[mode]['worker_mean_kb']['private_kb']
+        if private >= report['fork']['worker_mean_kb']['private_kb']:
+            failures.append(f'{mode} workers do not hold less private memory')
+        if args.max_private_mb is not None and private > args.max_private_mb * 1024:
+            failures.append(f'{mode} workers hold {private / 1024:.1f} MB of private memory, '
+                            f'over {args.max_private_mb} MB')
+    refreshed = report['refreshed']
+    if refreshed['master_version'] == report['preload']['master_version']:
+        failures.append('the master did not load the refreshed dataset')
+    if set(refreshed['worker_versions']) != {refreshed['master_version']} or refreshed['workers_reloading']:
+        failures.append('refreshed workers do not serve the version loaded by the master')
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
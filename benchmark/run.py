@@ -0,0 +1,181 @@
+"""Time the data preparation and the callbacks on synthetic datasets.
+
+    python -m benchmark.run --locations 280 1000 5000 --days 365 1000 1900 --output results.json
+    python -m benchmark.run --compare results.json
+
+Every stage is run `repeat` times per dataset size and reported in JSON (one
+record per size and stage). The callback stages need the app, which is only
+imported when data/spreading_covid19.csv exists. With --compare the run fails
+when a stage is slower than in a previous report by more than --tolerance.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import plotly
+
+import helper.figure_encoding
+from benchmark.synthetic import synthetic_dataset
+from helper.cube import Cube
+from helper.data_model import CompactData
+from helper.derived import Derived
+from helper.data_preparation import filter_by_dates, filter_df, get_daily_case, rolling_mean, sumurize_by_country
+from helper.dataset import Snapshot
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (countries, time_range) of the benchmarked views, countries are taken from the dataset
+VIEWS = {
+    'default': (0, 0),
+    '5 countries, 30 days': (5, 30),
+    '50 countries, 90 days': (50, 90),
+}
+
+
+def measure(function, repeat):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return {'median_seconds': statistics.median(durations), 'min_seconds': min(durations)}
+
+
+def load_app():
+    if not os.path.exists(os.path.join(ROOT, 'data', 'spreading_covid19.csv')):
+        print('data/spreading_covid19.csv is missing: the callbacks are not benchmarked',
+              file=sys.stderr)
+        return None
+    cwd = os.getcwd()
+    os.chdir(ROOT)
+    try:
+        import app
+    finally:
+        os.chdir(cwd)
+    return app
+
+
+def payload_bytes(outputs):
+    return len(json.dumps(outputs, cls=plotly.utils.PlotlyJSONEncoder).encode())
+
+
+def encoding_bytes(app, build):
+    """Payload of the outputs with plain figures, compact figures and compact typed arrays"""
+    settings = app.COMPACT_FIGURES, helper.figure_encoding.TYPED_ARRAYS
+    sizes = {}
+    try:
+        for name, compact, typed_arrays in [('raw_bytes', False, False), ('compact_bytes', True, False),
+                                            ('typed_array_bytes', True, True)]:
+            app.COMPACT_FIGURES, helper.figure_encoding.TYPED_ARRAYS = compact, typed_arrays
+            sizes[name] = payload_bytes(build())
+    finally:
+        app.COMPACT_FIGURES, helper.figure_encoding.TYPED_ARRAYS = settings
+    return sizes
+
+
+def benchmark_size(n_locations, n_days, repeat, app=None):
+    df = synthetic_dataset(n_locations, n_days)
+    states = df['State'].unique()
+    stages = {}
+
+    stages['CompactData'] = measure(lambda: CompactData.from_long(df), repeat)
+    data = CompactData.from_long(df)
+
+    # pandas data preparation on the location codes, as used by the callbacks before the cube
+    selection = list(states[:5])
+    stages['filter_df'] = measure(lambda: filter_df(data, selection, 30), repeat)
+    stages['sumurize_by_country'] = measure(
+        lambda: sumurize_by_country(filter_by_dates(data, 30)), repeat)
+    stages['get_daily_case'] = measure(lambda: get_daily_case(data), repeat)
+
+    # cube
+    stages['Cube'] = measure(lambda: Cube(data), repeat)
+    cube = Cube(data)
+    stages['Cube.summarize'] = measure(lambda: cube.summarize(time_range=30), repeat)
+    stages['Cube.daily_cases'] = measure(lambda: cube.daily_cases(), repeat)
+    daily_cases = cube.daily_cases()
+    stages['rolling_mean'] = measure(lambda: rolling_mean(daily_cases), repeat)
+    stages['Derived'] = measure(lambda: Derived(cube), repeat)
+    derived = Derived(cube)
+
+    # callbacks, without the result cache
+    if app is not None:
+        snapshot = Snapshot('benchmark', data, cube, derived)
+        for view, (n_countries, time_range) in VIEWS.items():
+            countries = sorted(states[:n_countries])
+            stages[f'update_map[{view}]'] = measure(
+                lambda: app.build_map(snapshot, time_range), repeat)
+            stages[f'global_update[{view}]'] = measure(
+                lambda: app.build_outputs(snapshot, countries, time_range), repeat)
+            outputs = app.build_outputs(snapshot, countries, time_range)
+            stages[f'serialize[{view}]'] = measure(lambda: payload_bytes(outputs), repeat)
+            stages[f'serialize[{view}]']['bytes'] = payload_bytes(outputs)
+            stages[f'serialize[{view}]'].update(encoding_bytes(
+                app, lambda: app.build_outputs(snapshot, countries, time_range)))
+            stages[f'update_map[{view}]']['bytes'] = payload_bytes(
+                app.build_map(snapshot, time_range))
+            stages[f'update_map[{view}]'].update(encoding_bytes(
+                app, lambda: app.build_map(snapshot, time_range)))
+
+    return [dict(locations=n_locations, days=n_days, rows=len(df), stage=stage, **result)
+            for stage, result in stages.items()]
+
+
+def compare(results, previous, tolerance):
+    """Records slower than in the previous report by more than tolerance (0.2 = 20%)"""
+    reference = {(r['locations'], r['days'], r['stage']): r for r in previous['results']}
+    regressions = []
+    for record in results:
+        before = reference.get((record['locations'], record['days'], record['stage']))
+        if before and record['min_seconds'] > before['min_seconds'] * (1 + tolerance):
+            regressions.append(dict(record, previous_min_seconds=before['min_seconds']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--locations', type=int, nargs='+', default=[280, 1000])
+    parser.add_argument('--days', type=int, nargs='+', default=[365, 1000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='write the report to this file instead of stdout')
+    parser.add_argument('--compare', help='previous report to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('--no-app', action='store_true', help='skip the callback stages')
+    args = parser.parse_args(argv)
+
+    app = None if args.no_app else load_app()
+    results = []
+    for n_locations in args.locations:
+        for n_days in args.days:
+            results.extend(benchmark_size(n_locations, n_days, args.repeat, app))
+
+    report = {
+        'meta': {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+                 'numpy': np.__version__, 'pandas': pd.__version__, 'repeat': args.repeat},
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"regression: {regression['stage']} ({regression['locations']} x {regression['days']}) "
+                  f"{regression['previous_min_seconds']:.4f}s -> {regression['min_seconds']:.4f}s",
+                  file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""Ingest wall time of the concurrent download of the sources against a sequential one.
+
+    python -m benchmark.sources --locations 1000 --days 1000 --seconds 2
+
+The five JHU sources (global confirmed, death and recovered, US confirmed and
+death) are synthetic files served by a local HTTP stand-in that streams every
+body over about --seconds seconds, like a slow link, and answers the first
+request of every file with a 503 to exercise the retries. The sequential run
+reads the sources one after the other, the concurrent one is fetch_sources.
+The run fails when the concurrent download takes more than 1.5 times the
+slowest source, or when collect_data through the stand-in doesn't write the
+same datasets as collect_data reading the files from the directory.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+from benchmark.synthetic import synthetic_source, synthetic_us_source
+from data.collect_data import URL_US_CONFIRMED, URL_US_DEATH, collect_data, columnar_path, us_path
+from helper.sources import fetch_sources, read_source
+
+FILES = {
+    'url_confirmed': 'time_series_covid19_confirmed_global.csv',
+    'url_death': 'time_series_covid19_deaths_global.csv',
+    'url_recovered': 'time_series_covid19_recovered_global.csv',
+    'url_us_confirmed': 'time_series_covid19_confirmed_US.csv',
+    'url_us_death': 'time_series_covid19_deaths_US.csv',
+}
+CHUNKS = 50
+
+
+def write_sources(directory, n_locations, n_days):
+    frames = {
+        'url_confirmed': synthetic_source(n_locations, n_days, 'Confirmed'),
+        'url_death': synthetic_source(n_locations, n_days, 'Death'),
+        'url_recovered': synthetic_source(n_locations, n_days, 'Recovered'),
+        'url_us_confirmed': synthetic_us_source(n_locations, n_days, 'Confirmed', seed=1),
+        'url_us_death': synthetic_us_source(n_locations, n_days, 'Death', seed=1),
+    }
+    for name, df in frames.items():
+        df.to_csv(os.path.join(directory, FILES[name]), index=False)
+
+
+def stand_in(directory, seconds):
+    """Local HTTP server streaming the files of directory in CHUNKS parts over `seconds`,
+    the first request of every file gets a 503"""
+    failed = set()
+    lock = threading.Lock()
+
+    class Handler(SimpleHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, directory=directory, **kwargs)
+
+        def do_GET(self):
+            path = os.path.join(directory, os.path.basename(self.path))
+            if not os.path.exists(path):
+                self.send_error(404)
+                return
+            with lock:
+                first = self.path not in failed
+                failed.add(self.path)
+            if first:
+                self.send_response(503)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            with open(path, 'rb') as f:
+                body = f.read()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/csv')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            size = -(-len(body) // CHUNKS)
+            for start in range(0, len(body), size):
+                self.wfile.write(body[start:start + size])
+                time.sleep(seconds / CHUNKS)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def same_files(first, second):
+    return all(pd.read_feather(columnar_path(a)).equals(pd.read_feather(columnar_path(b)))
+               for a, b in ((first, second), (us_path(first), us_path(second))))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--locations', type=int, default=1000)
+    parser.add_argument('--days', type=int, default=1000)
+    parser.add_argument('--seconds', type=float, default=2., help='streaming time of every source')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        write_sources(directory, args.locations, args.days)
+        server, url = stand_in(directory, args.seconds)
+        urls = {name: f'{url}/{file_name}' for name, file_name in FILES.items()}
+        options = {'backoff': 0.1}
+        try:
+            sources = {name: timed(read_source, source_url, **options)[0]
+                       for name, source_url in urls.items()}
+            concurrent, _ = timed(fetch_sources, urls, **options)
+            collect, _ = timed(collect_data, os.path.join(directory, 'http.csv'), **urls, **options)
+        finally:
+            server.shutdown()
+        local, _ = timed(collect_data, os.path.join(directory, 'local.csv'), source_dir=directory,
+                         url_us_confirmed=URL_US_CONFIRMED, url_us_death=URL_US_DEATH)
+        same = same_files(os.path.join(directory, 'http.csv'), os.path.join(directory, 'local.csv'))
+
+    report = {
+        'source_seconds': sources,
+        'sequential_seconds': sum(sources.values()),
+        'concurrent_seconds': concurrent,
+        'collect_data_seconds': collect,
+        'collect_data_local_seconds': local,
+        'same_datasets': same,
+    }
+    print(json.dumps(report, indent=2))
+
+    failures = []
+    if concurrent > 1.5 * max(sources.values()):
+        failures.append(f'the concurrent download takes {concurrent:.2f}s, '
+                        f'the slowest source {max(sources.values()):.2f}s')
+    if not same:
+        failures.append('collect_data writes different datasets from the stand-in and the directory')
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""Measure the boot of the app against a time budget.
+
+    python -m benchmark.startup --repeat 5 --budget 1.0
+
+Every run imports app.py in a new interpreter, like a dyno boot or a gunicorn
+worker without --preload, and times the import and the first default-view
+callbacks. The first run after a change of the data file, of the figure
+settings or of the code builds the startup snapshot and is reported apart. The run fails when the median import time is
+over --budget seconds or when pandas is imported at boot.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# median boot time in seconds
+BUDGET = 1.0
+
+PROBE = '''
+import json, sys, time
+sys.path.insert(0, sys.argv[1])
+start = time.perf_counter()
+import app
+boot = time.perf_counter() - start
+pandas_at_boot = 'pandas' in sys.modules
+with app.server.test_request_context():
+    start = time.perf_counter()
+    app.update_map(0, None, None, None)
+    app.global_update(None, 0)
+    first_callbacks = time.perf_counter() - start
+print(json.dumps({'boot_seconds': boot, 'first_callbacks_seconds': first_callbacks,
+                  'pandas_at_boot': pandas_at_boot, 'startup_snapshot': app.startup is not None}))
+'''
+
+
+def probe(directory=ROOT, env=None):
+    """Boot of the app run from directory, on its data/ files"""
+    output = subprocess.run([sys.executable, '-c', PROBE, ROOT], cwd=directory, env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def slowest_imports(count=10):
+    """Modules with the largest cumulative import time (python -X importtime)"""
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=ROOT,
+                            check=True, capture_output=True, text=True).stderr
+    modules = []
+    for line in stderr.splitlines():
+        if line.startswith('import time:') and '|' in line and 'cumulative' not in line:
+            _, cumulative, name = line.split('|')
+            modules.append((int(cumulative) / 1e6, name.strip()))
+    return [{'module': name, 'seconds': seconds}
+            for seconds, name in sorted(modules, reverse=True)[:count]]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--budget', type=float, default=BUDGET, help='median boot time in seconds')
+    args = parser.parse_args(argv)
+
+    runs = [probe() for _ in range(args.repeat + 1)]
+    # without a startup snapshot the first run builds it
+    cold = [run for run in runs if not run['startup_snapshot']]
+    warm = [run for run in runs if run['startup_snapshot']][:args.repeat]
+    boot = statistics.median(run['boot_seconds'] for run in warm)
+    report = {
+        'budget_seconds': args.budget,
+        'boot_seconds': boot,
+        'first_callbacks_seconds': statistics.median(run['first_callbacks_seconds'] for run in warm),
+        'pandas_at_boot': any(run['pandas_at_boot'] for run in warm),
+        'snapshot_build_seconds': cold[0]['boot_seconds'] if cold else None,
+        'slowest_imports': slowest_imports(),
+    }
+    print(json.dumps(report, indent=2))
+
+    failures = []
+    if boot > args.budget:
+        failures.append(f'boot takes {boot:.3f}s, over the budget of {args.budget:.3f}s')
+    if report['pandas_at_boot']:
+        failures.append('pandas is imported at boot')
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,69 @@
+"""Compare load time and memory of the CSV and the memory-mapped columnar dataset.
+
+    python -m benchmark.storage [n_locations] [n_days]
+
+Each format is loaded in a fresh interpreter; the memory columns come from
+/proc/self/smaps_rollup (Linux): `file_backed_kb` are page-cache pages of the
+memory-mapped file, shared by every process reading it, `anonymous_kb` is the heap
+each process holds on its own. Only the read is measured: the app then normalizes
+the frame (CompactData) into private arrays, shared by the workers only when the
+master preloads them (gunicorn.conf.py).
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmark.synthetic import synthetic_dataset
+from data.collect_data import columnar_path, save_columnar
+
+PROBE = '''
+import json, sys, time
+
+def memory():
+    values = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                values[parts[0].rstrip(':')] = int(parts[1])
+    return values
+
+from helper.dataset import read_dataset
+import pyarrow.feather
+before = memory()
+start = time.perf_counter()
+df = read_dataset(sys.argv[1])
+elapsed = time.perf_counter() - start
+after = memory()
+rss = after['Rss'] - before['Rss']
+anonymous = after['Anonymous'] - before['Anonymous']
+print(json.dumps({'seconds': elapsed, 'rss_kb': rss, 'anonymous_kb': anonymous,
+                  'file_backed_kb': rss - anonymous}))
+'''
+
+
+def probe(path):
+    output = subprocess.run([sys.executable, '-c', PROBE, path],
+                            capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return json.loads(output.stdout)
+
+
+def run(n_locations=280, n_days=600):
+    df = synthetic_dataset(n_locations, n_days)
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = os.path.join(directory, 'spreading_covid19.csv')
+        df.to_csv(csv_path, index=False)
+        save_columnar(df, csv_path)
+        return {
+            'rows': len(df),
+            'csv': probe(csv_path),
+            'columnar': probe(columnar_path(csv_path)),
+        }
+
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:3]]
+    print(json.dumps(run(*sizes), indent=2))
@@ -0,0 +1,91 @@
+"""Synthetic datasets for the benchmarks.
+
+    python -m benchmark.synthetic n_locations n_days saving_path
+
+`synthetic_dataset` has the schema written by data.collect_data (State, Lat,
+Long, Date, Confirmed, Death), one row per location and per day, the rows of
+a location together and sorted by date. `synthetic_source` and
+`synthetic_us_source` have the layouts of the global and US JHU time series
+that collect_data reads. Sizes go from the ~280 JHU
+locations up to county level (~5k locations) and 5+ years of days.
+"""
+import sys
+
+import numpy as np
+import pandas as pd
+
+FIRST_DAY = '2020-01-22'
+
+
+def cumulative_counts(rng, n_locations, n_days, scale):
+    # daily new cases with an epidemic wave per location and a few downward revisions
+    days = np.arange(n_days)
+    peaks = rng.uniform(0, n_days, (n_locations, 1))
+    widths = rng.uniform(20, 120, (n_locations, 1))
+    sizes = rng.lognormal(0, 1.5, (n_locations, 1))
+    rates = scale * sizes * np.exp(-((days - peaks) / widths) ** 2)
+    daily = rng.poisson(rates)
+    revisions = rng.random((n_locations, n_days)) < 0.002
+    daily[revisions] = -daily[revisions]
+    return daily.cumsum(axis=1)
+
+
+def synthetic_counts(n_locations, n_days, seed=0):
+    rng = np.random.default_rng(seed)
+    confirmed = cumulative_counts(rng, n_locations, n_days, 200)
+    # deaths follow the cases with a location-specific fatality rate
+    fatality = rng.uniform(0.005, 0.04, (n_locations, 1))
+    death = np.floor(np.maximum(confirmed, 0) * fatality).astype(np.int64)
+    locations = pd.DataFrame({
+        'State': [f'Location {i}' for i in range(n_locations)],
+        'Lat': rng.uniform(-60, 70, n_locations).round(4),
+        'Long': rng.uniform(-180, 180, n_locations).round(4),
+    })
+    return locations, confirmed, death
+
+
+def synthetic_dataset(n_locations, n_days, seed=0):
+    locations, confirmed, death = synthetic_counts(n_locations, n_days, seed)
+    return pd.DataFrame({
+        'State': np.repeat(locations['State'].to_numpy(), n_days),
+        'Lat': np.repeat(locations['Lat'].to_numpy(), n_days),
+        'Long': np.repeat(locations['Long'].to_numpy(), n_days),
+        'Date': np.tile(pd.date_range(FIRST_DAY, periods=n_days), n_locations),
+        'Confirmed': confirmed.ravel(),
+        'Death': death.ravel(),
+    })
+
+
+def synthetic_source(n_locations, n_days, metric='Confirmed', seed=0):
+    """Wide frame with the layout of the JHU time series, metric is Confirmed, Death or Recovered"""
+    locations, confirmed, death = synthetic_counts(n_locations, n_days, seed)
+    dates = pd.date_range(FIRST_DAY, periods=n_days).strftime('%-m/%-d/%y')
+    counts = {'Confirmed': confirmed, 'Death': death,
+              'Recovered': np.maximum(confirmed - death, 0)}[metric]
+    df = pd.DataFrame(counts, columns=dates)
+    df.insert(0, 'Long', locations['Long'])
+    df.insert(0, 'Lat', locations['Lat'])
+    df.insert(0, 'Country/Region', locations['State'])
+    df.insert(0, 'Province/State', None)
+    return df
+
+
+def synthetic_us_source(n_locations, n_days, metric='Confirmed', seed=0):
+    """Wide frame with the layout of the JHU US county time series, metric is Confirmed or Death"""
+    df = synthetic_source(n_locations, n_days, metric, seed)
+    names = df.pop('Country/Region').str.replace('Location', 'County')
+    df.pop('Province/State')
+    columns = {
+        'UID': 84000000 + np.arange(n_locations), 'iso2': 'US', 'iso3': 'USA', 'code3': 840,
+        'FIPS': np.arange(n_locations, dtype=float), 'Admin2': names, 'Province_State': 'State',
+        'Country_Region': 'US', 'Lat': df.pop('Lat'), 'Long_': df.pop('Long'),
+        'Combined_Key': names + ', State, US',
+    }
+    if metric == 'Death':
+        columns['Population'] = 100000
+    return pd.concat([pd.DataFrame(columns), df], axis=1)
+
+
+if __name__ == '__main__':
+    n_locations, n_days, saving_path = int(sys.argv[1]), int(sys.argv[2]), sys.argv[3]
+    synthetic_dataset(n_locations, n_days).to_csv(saving_path, index=False)
@@ -1,8 +1,25 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+
+import numpy as np
 import pandas as pd
 
+from helper.dataset import columnar_path, replace_atomically
+from helper.metrics import metrics
+from helper.sources import fetch_sources
+
 # Load the data
 URL_CONFIRMED = 'https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/time_series_covid19_confirmed_global.csv'
 URL_DEATH = 'https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/time_series_covid19_deaths_global.csv'
+URL_RECOVERED = 'https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/time_series_covid19_recovered_global.csv'
+# the US county series are not read by the app yet, they are only collected when asked for
+URL_US_CONFIRMED = 'https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/time_series_covid19_confirmed_US.csv'
+URL_US_DEATH = 'https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/time_series_covid19_deaths_US.csv'
+
+LOCATION_KEYS = ['Province/State', 'Country/Region']
 
 
 def reshape_df(df, state='Confirmed'):
@@ -13,25 +30,165 @@ def reshape_df(df, state='Confirmed'):
     return df
 
 
-def collect_data(saving_path):
-    df_confirmed = pd.read_csv(URL_CONFIRMED)
-    df_death = pd.read_csv(URL_DEATH)
+def save_columnar(df, saving_path):
+    # uncompressed and in a single chunk so that every column can be
+    # memory-mapped and read without a copy
+    replace_atomically(columnar_path(saving_path), lambda path: df.reset_index(drop=True).to_feather(
+        path, compression='uncompressed', chunksize=max(len(df), 1)))
+
+
+def read_stored(saving_path):
+    if os.path.exists(columnar_path(saving_path)):
+        return pd.read_feather(columnar_path(saving_path))
+    return pd.read_csv(saving_path, parse_dates=['Date'])
+
+
+def us_path(saving_path):
+    stem, extension = os.path.splitext(saving_path)
+    return f'{stem}_us{extension}'
+
+
+def us_to_global(df):
+    """US county series in the layout of the global ones, a county is named by its Combined_Key"""
+    first_date = df.columns.get_loc('Combined_Key') + 1
+    dates = [column for column in df.columns[first_date:] if column != 'Population']
+    locations = pd.DataFrame({'Province/State': df['Combined_Key'], 'Country/Region': df['Country_Region'],
+                              'Lat': df['Lat'], 'Long': df['Long_']})
+    return pd.concat([locations, df[dates]], axis=1)
+
+
+def checksums_path(saving_path):
+    return os.path.splitext(saving_path)[0] + '.checksums.json'
+
+
+def column_checksums(df):
+    """sha1 of every date column of a wide JHU frame, the 4 location columns are hashed together"""
+    location_columns = list(df.columns[:4])
+    locations = pd.util.hash_pandas_object(df[location_columns], index=False)
+    checksums = {'locations': hashlib.sha1(locations.to_numpy().tobytes()).hexdigest()}
+
+    # one contiguous block per date column
+    counts = np.asfortranarray(df.iloc[:, 4:].to_numpy(dtype='float64'))
+    for i, column in enumerate(df.columns[4:]):
+        checksums[column] = hashlib.sha1(counts[:, i].tobytes()).hexdigest()
+    return checksums
+
 
+def to_long(frames):
+    """Long frame of the wide frames {metric: frame}, the Recovered series is optional
+    and reported for fewer locations (Canada as a whole): 0 elsewhere"""
+    frames = {metric: df.copy() for metric, df in frames.items()}
     # Fill the NaN
-    df_confirmed['Province/State'].fillna(
-        df_confirmed['Country/Region'], inplace=True)
-    df_death['Province/State'].fillna(df_death['Country/Region'], inplace=True)
+    for df in frames.values():
+        df['Province/State'].fillna(df['Country/Region'], inplace=True)
 
-    df_confirmed = df_confirmed.pipe(reshape_df, 'Confirmed')
-    df_death = df_death.pipe(reshape_df, 'Death')
+    df_confirmed = frames['Confirmed'].pipe(reshape_df, 'Confirmed')
+    df_death = frames['Death'].pipe(reshape_df, 'Death')
 
     df_covid19 = pd.merge(df_confirmed, df_death)
-    df_covid19['Date'] = pd.to_datetime(df_covid19['Date'])
+    if 'Recovered' in frames:
+        df_recovered = frames['Recovered'].pipe(reshape_df, 'Recovered')
+        df_recovered = df_recovered[LOCATION_KEYS + ['Date', 'Recovered']].drop_duplicates(
+            LOCATION_KEYS + ['Date'])
+        df_covid19 = pd.merge(df_covid19, df_recovered, how='left')
+        df_covid19['Recovered'] = df_covid19['Recovered'].fillna(0).astype('int64')
+    # every date repeats for each location: parse them once
+    codes, dates = pd.factorize(df_covid19['Date'])
+    df_covid19['Date'] = pd.to_datetime(dates)[codes]
     df_covid19.drop(columns='Country/Region', inplace=True)
     df_covid19.rename(columns={'Province/State': 'State'}, inplace=True)
+    return df_covid19
+
+
+def save_checksums(checksums, saving_path):
+    def write(path):
+        with open(path, 'w') as f:
+            json.dump(checksums, f)
+    # written after the data: after a crash the missing dates are processed again
+    replace_atomically(checksums_path(saving_path), write)
+
+
+def save_data(df_covid19, saving_path, checksums):
+    replace_atomically(
+        saving_path, lambda path: df_covid19.to_csv(path, index=False))
+    save_columnar(df_covid19, saving_path)
+    save_checksums(checksums, saving_path)
+
+
+def update_data(frames, saving_path, checksums, stored):
+    """Process only the date columns that are new or whose checksum changed,
+    return the number of processed columns"""
+    dates = [column for column in frames['Confirmed'].columns[4:] if column in frames['Death']
+             and any(stored[metric].get(column) != checksums[metric].get(column) for metric in checksums)]
+    if not dates:
+        # nothing new: mark the files as fresh for the scheduler
+        for path in (saving_path, columnar_path(saving_path)):
+            os.utime(path)
+        return 0
+
+    new_rows = to_long({metric: df[list(df.columns[:4]) + [date for date in dates if date in df]]
+                        for metric, df in frames.items()})
+
+    df_covid19 = read_stored(saving_path)
+    revised = df_covid19['Date'].isin(pd.to_datetime(dates))
+    if revised.any():
+        # keep the rows of every location sorted by date
+        df_covid19 = pd.concat([df_covid19[~revised], new_rows], ignore_index=True)
+        df_covid19.sort_values('Date', kind='mergesort', inplace=True)
+        save_data(df_covid19, saving_path, checksums)
+    else:
+        # only new days: copy the csv and append them to the copy
+        def append(path):
+            shutil.copyfile(saving_path, path)
+            new_rows.to_csv(path, mode='a', header=False, index=False)
+        replace_atomically(saving_path, append)
+        save_columnar(pd.concat([df_covid19, new_rows], ignore_index=True), saving_path)
+        save_checksums(checksums, saving_path)
+    return len(dates)
+
+
+def store_series(frames, saving_path, incremental=False):
+    """Save the long frame of the wide frames {metric: frame}, return the number of processed dates"""
+    checksums = {metric: column_checksums(df) for metric, df in frames.items()}
+
+    if incremental and os.path.exists(saving_path):
+        try:
+            with open(checksums_path(saving_path)) as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            stored = None
+        # a new or moved location, or a new series, changes every column: collect everything
+        if stored and set(stored) == set(checksums) and all(
+                stored[metric]['locations'] == checksums[metric]['locations'] for metric in checksums):
+            return update_data(frames, saving_path, checksums, stored)
+
+    save_data(to_long(frames), saving_path, checksums)
+    return len(checksums['Confirmed']) - 1
+
+
+def collect_data(saving_path, url_confirmed=URL_CONFIRMED, url_death=URL_DEATH, url_recovered=URL_RECOVERED,
+                 url_us_confirmed=None, url_us_death=None, incremental=False,
+                 source_dir=None, **options):
+    """Collect the global series into saving_path and, when both of their sources are given
+    (URL_US_CONFIRMED, URL_US_DEATH), the US county series next to it (us_path). A source set
+    to None is skipped. The sources are
+    downloaded at the same time, source_dir reads them from a local directory instead (same file
+    names), options are the timeouts and retries of helper.sources.read_source."""
+    laps = metrics.laps('collect_data')
+    frames = fetch_sources({'Confirmed': url_confirmed, 'Death': url_death, 'Recovered': url_recovered,
+                            'US Confirmed': url_us_confirmed, 'US Death': url_us_death},
+                           source_dir, **options)
+    laps.lap('download')
 
-    df_covid19.to_csv(saving_path, index=False)
+    processed = store_series({metric: frames[metric] for metric in ('Confirmed', 'Death', 'Recovered')
+                              if metric in frames}, saving_path, incremental)
+    laps.lap('global')
+    if 'US Confirmed' in frames and 'US Death' in frames:
+        store_series({'Confirmed': us_to_global(frames['US Confirmed']),
+                      'Death': us_to_global(frames['US Death'])}, us_path(saving_path), incremental)
+        laps.lap('us')
+    return processed
 
 
 if __name__ == '__main__':
-    collect_data()
+    collect_data(sys.argv[1] if len(sys.argv) > 1 else 'data/spreading_covid19.csv')
@@ -0,0 +1,63 @@
+"""gunicorn settings, read from the working directory by `gunicorn app:server`.
+
+PRELOAD=1 imports the app and loads the dataset once in the master, then the
+workers are forked and share its pages copy-on-write instead of loading their
+own copy. The normalized tables (CompactData), the Cube and the derived series
+are private arrays of the process that loads them: they are only shared
+through the fork, and never written after the load. gc.freeze keeps the
+collector from writing to the headers of the preloaded objects, which would
+copy their pages into every worker. The workers start the refresh scheduler
+after the fork. The worker that collected a new dataset sends SIGHUP to the
+master: the master loads the new version (on_reload), forks new workers from
+it and stops the old ones gracefully, so a refresh keeps the pages shared.
+
+Memory per worker (python -m benchmark.preload --workers 4, 1000 locations x
+1000 days, Linux smaps_rollup, after the default view and a selection, none
+served from the shared cache):
+
+    mode        rss      pss      private
+    fork        ~234 MB  ~185 MB  ~173 MB
+    preload     ~191 MB   ~57 MB   ~24 MB
+    refreshed   ~240 MB   ~68 MB   ~25 MB
+
+The preloading master itself holds ~234 MB rss (~29 MB private), ~284 MB rss
+after a refresh: the heap of the previous version is freed but not returned.
+"""
+import gc
+import os
+import signal
+
+preload_app = os.environ.get('PRELOAD', '0') == '1'
+worker_class = 'gthread'
+threads = int(os.environ.get('THREADS', '4'))
+max_requests = int(os.environ.get('MAX_REQUESTS', '0'))
+max_requests_jitter = max_requests // 10
+
+
+def preload():
+    import app
+    # the previous version is only freed once it is out of the permanent generation
+    gc.unfreeze()
+    app.warm()
+    gc.collect()
+    gc.freeze()
+
+
+def when_ready(server):
+    # called in the master after the app is preloaded and before the first fork
+    if preload_app:
+        preload()
+
+
+def on_reload(server):
+    # called in the master on SIGHUP, before the new workers are forked
+    if preload_app:
+        preload()
+
+
+def post_fork(server, worker):
+    if preload_app:
+        import app
+        # the master loads the new version and replaces the workers
+        app.scheduler.on_collected = lambda: os.kill(worker.ppid, signal.SIGHUP)
+        app.scheduler.start()
@@ -0,0 +1,120 @@
+import json
+
+import numpy as np
+from flask import request
+
+# metric of /api/series: daily new cases (get_daily_case) or cumulative counts
+SERIES_METRICS = {'daily': None, 'confirmed': 'Confirmed', 'death': 'Death'}
+FORMATS = {'json': 'application/json', 'arrow': 'application/vnd.apache.arrow.stream'}
+
+
+class QueryError(ValueError):
+    pass
+
+
+def parse_range(args):
+    try:
+        time_range = int(args.get('range', 0))
+    except ValueError:
+        raise QueryError('range must be a number of days') from None
+    if time_range < 0:
+        raise QueryError('range must be a number of days')
+    return time_range
+
+
+def parse_states(args, known):
+    """States of the query, `states=France,Italy` or repeated `states=`, None for all of them"""
+    states = [state for value in args.getlist('states') for state in value.split(',') if state]
+    unknown = sorted(set(states) - set(known))
+    if unknown:
+        raise QueryError(f"unknown states: {', '.join(unknown)}")
+    return list(dict.fromkeys(states)) or None
+
+
+def parse_choice(args, name, choices, default):
+    value = args.get(name, default)
+    if value not in choices:
+        raise QueryError(f"{name} must be one of {', '.join(choices)}")
+    return value
+
+
+def summary(derived, states=None, time_range=0):
+    """sumurize_by_country(filter_df(df, states, time_range)) from the derived series"""
+    return derived.summarize(states, time_range)
+
+
+def series(derived, states=None, time_range=0, metric='daily'):
+    """Dates x States frame of get_daily_case, or of the cumulative counts, for all the states
+    of the query at once"""
+    if SERIES_METRICS[metric] is None:
+        # whole numbers: sent as integers
+        return derived.daily_cases(states, time_range).astype(np.int64)
+    return derived.cumulative(states, time_range, SERIES_METRICS[metric])
+
+
+def encode_arrow(df):
+    import pyarrow as pa
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def encode_summary(df, output_format, meta):
+    if output_format == 'arrow':
+        return encode_arrow(df)
+    columns = {column: df[column].tolist() for column in df.columns}
+    return json.dumps(dict(meta, rows=len(df), columns=columns))
+
+
+def encode_series(df, output_format, meta):
+    if output_format == 'arrow':
+        df = df.reset_index()
+        # date32 column
+        df['Date'] = df['Date'].dt.date
+        df.columns = df.columns.astype(str)
+        return encode_arrow(df)
+    values = df.to_numpy()
+    dates = df.index.to_numpy().astype('datetime64[D]')
+    return json.dumps(dict(meta, dates=np.datetime_as_string(dates).tolist(),
+                           series={state: values[:, i].tolist() for i, state in enumerate(df.columns)}))
+
+
+def register_api(server, snapshot):
+    """Read-only routes on the Flask server, snapshot() returns the current Snapshot of the dataset.
+
+        GET /api/summary?range=30&states=France,Italy&format=json|arrow
+        GET /api/series?states=France,Italy&metric=daily|confirmed|death&range=30&format=json|arrow
+
+    The responses only depend on the dataset version and the query string: they are tagged,
+    cached and compressed once by ConditionalResponses(paths=['/api/'])."""
+
+    def respond(encode, compute):
+        try:
+            current = snapshot()
+            output_format = parse_choice(request.args, 'format', FORMATS, 'json')
+            df, meta = compute(current)
+        except QueryError as error:
+            return server.response_class(json.dumps({'error': str(error)}), status=400,
+                                         mimetype='application/json')
+        meta = dict(meta, version=current.version)
+        return server.response_class(encode(df, output_format, meta), mimetype=FORMATS[output_format])
+
+    @server.route('/api/summary')
+    def api_summary():
+        def compute(current):
+            states = parse_states(request.args, current.cube.states)
+            time_range = parse_range(request.args)
+            return summary(current.derived, states, time_range), {'range': time_range, 'states': states}
+        return respond(encode_summary, compute)
+
+    @server.route('/api/series')
+    def api_series():
+        def compute(current):
+            states = parse_states(request.args, current.cube.states)
+            time_range = parse_range(request.args)
+            metric = parse_choice(request.args, 'metric', SERIES_METRICS, 'daily')
+            return (series(current.derived, states, time_range, metric),
+                    {'range': time_range, 'states': states, 'metric': metric})
+        return respond(encode_series, compute)
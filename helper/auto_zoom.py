@@ -1,53 +1,82 @@
-import planar
 import numpy as np
 
+from helper.level_of_detail import TILE_PIXELS, world_pixels
 
-def get_plotting_zoom_level_and_center_coordinates_from_lonlat_tuples(
-        longitudes=None, latitudes=None, lonlat_pairs=None):
-    """Function documentation:\n
-    Basic framework adopted from Krichardson under the following thread:
-    https://community.plotly.com/t/dynamic-zoom-for-mapbox/32658/7
+# usual size of the map card in pixels, a selection is fitted in it with some padding
+MAP_PIXELS = (700, 500)
+PADDING = 0.8
+MIN_ZOOM, MAX_ZOOM = 0.5, 5.
 
-    # NOTE:
-    # THIS IS A TEMPORARY SOLUTION UNTIL THE DASH TEAM IMPLEMENTS DYNAMIC ZOOM
-    # in their plotly-functions associated with mapbox, such as go.Densitymapbox() etc.
 
-    Returns the appropriate zoom-level for these plotly-mapbox-graphics along with
-    the center coordinate tuple of all provided coordinate tuples.
+def covering_longitudes(longitudes):
     """
+        Smallest arc (west, east) containing the longitudes, east is larger than 180 when
+        the arc crosses the antimeridian. It starts after the largest gap between two
+        consecutive longitudes around the globe.
+    """
+    longitudes = np.unique(np.mod(np.asarray(longitudes, dtype=float) + 180, 360) - 180)
+    gaps = np.append(np.diff(longitudes), longitudes[0] + 360 - longitudes[-1])
+    largest = int(np.argmax(gaps))
+    if largest == len(longitudes) - 1:
+        return longitudes[0], longitudes[-1]
+    return longitudes[largest + 1], longitudes[largest] + 360
+
+
+def zoom_and_center(longitudes, latitudes):
+    """Mapbox zoom and center {'lon', 'lat'} fitting the coordinates in the map"""
+    longitudes, latitudes = np.asarray(longitudes, dtype=float), np.asarray(latitudes, dtype=float)
+    located = ~(np.isnan(longitudes) | np.isnan(latitudes))
+    if not located.any():
+        return None, None
+    longitudes, latitudes = longitudes[located], latitudes[located]
+
+    west, east = covering_longitudes(longitudes)
+    south, north = latitudes.min(), latitudes.max()
+    # sizes as a share of the world map at zoom 0, the latitudes in Web Mercator
+    _, (y_south, y_north) = world_pixels(np.array([south, north]), np.zeros(2), 0)
+    width = (east - west) / 360
+    height = (y_south - y_north) / TILE_PIXELS
+    with np.errstate(divide='ignore'):
+        zoom = np.log2(PADDING * np.array(MAP_PIXELS) / TILE_PIXELS / np.array([width, height]))
+    zoom = float(np.clip(zoom.min(), MIN_ZOOM, MAX_ZOOM))
+
+    center_long = np.mod((west + east) / 2 + 180, 360) - 180
+    center_y = (y_south + y_north) / 2 / TILE_PIXELS
+    center_lat = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * center_y))))
+    return zoom, {'lon': float(center_long), 'lat': float(center_lat)}
+
+
+class LocationIndex:
+    """
+        >> ATTRIBUTES <<
+        ---------------------------------------------------------------------------------------------
+            * locations: Lat, Long and State of the locations, as Cube.locations
+
+        >> OUTPUT <<
+        -------------------------------------------------------
+        Coordinates and State codes of the located locations, built once per dataset version.
+        zoom_and_center(countries) selects the rows of the countries with one lookup in the
+        sorted States and gives the zoom and center of the map showing them.
+    """
+
+    def __init__(self, locations):
+        locations = locations.dropna(subset=['Lat', 'Long'])
+        self.states, self.codes = np.unique(locations['State'].to_numpy(dtype=str), return_inverse=True)
+        self.longitudes = locations['Long'].to_numpy(dtype=float)
+        self.latitudes = locations['Lat'].to_numpy(dtype=float)
+
+    def rows(self, countries):
+        """Boolean mask of the locations of the countries"""
+        countries = np.asarray(countries, dtype=str)
+        positions = np.searchsorted(self.states, countries)
+        found = positions < len(self.states)
+        found[found] = self.states[positions[found]] == countries[found]
+        selected = np.zeros(len(self.states), dtype=bool)
+        selected[positions[found]] = True
+        return selected[self.codes]
 
-    # Check whether the list hasn't already be prepared outside this function
-    if lonlat_pairs is None:
-        # Check whether both latitudes and longitudes have been passed,
-        # or if the list lenghts don't match
-        if ((latitudes is None or longitudes is None)
-                or (len(latitudes) != len(longitudes))):
-            # Otherwise, return the default values of 0 zoom and the coordinate origin as center point
-            return 0, (0, 0)
-
-        # Instantiate collator list for all coordinate-tuples
-        lonlat_pairs = [(longitudes[i], latitudes[i])
-                        for i in range(len(longitudes))]
-
-    # Get the boundary-box via the planar-module
-    b_box = planar.BoundingBox(lonlat_pairs)
-
-    # In case the resulting b_box is empty, return the default 0-values as well
-    if b_box.is_empty:
-        return 0, (0, 0)
-
-    # Otherwise, get the area of the bounding box in order to calculate a zoom-level
-    area = b_box.height * b_box.width
-
-    # * 1D-linear interpolation with numpy:
-    # - Pass the area as the only x-value and not as a list, in order to return a scalar as well
-    # - The x-points "xp" should be in parts in comparable order of magnitude of the given area
-    # - The zpom-levels are adapted to the areas, i.e. start with the smallest area possible of 0
-    # which leads to the highest possible zoom value 20, and so forth decreasing with increasing areas
-    # as these variables are antiproportional
-    zoom = np.interp(x=area,
-                     xp=[0, 5**-10, 4**-10, 3**-10, 2**-10, 1**-10, 1**-5],
-                     fp=[20, 17, 16, 15, 14, 7, 5])
-
-    # Finally, return the zoom level and the associated boundary-box center coordinates
-    return zoom, b_box.center
+    def zoom_and_center(self, countries):
+        if not countries:
+            return None, None
+        rows = self.rows(countries)
+        return zoom_and_center(self.longitudes[rows], self.latitudes[rows])
@@ -0,0 +1,31 @@
+import base64
+
+import numpy as np
+
+from helper.cube import METRICS
+
+
+def typed_array(values, dtype):
+    """Base64 of a little-endian array, decoded in the browser as a TypedArray"""
+    values = np.ascontiguousarray(values, dtype=np.dtype(dtype).newbyteorder('<'))
+    return {'dtype': np.dtype(dtype).name, 'data': base64.b64encode(values.tobytes()).decode()}
+
+
+def encode_dataset(snapshot, config=None):
+    """Compact copy of the snapshot cube for the client-side mode (assets/clientside.js)"""
+    cube = snapshot.cube
+    encoded = {
+        'version': snapshot.version,
+        'states': cube.states.tolist(),
+        'lat': typed_array(cube.locations['Lat'].fillna(0), 'float32'),
+        'long': typed_array(cube.locations['Long'].fillna(0), 'float32'),
+        'located': typed_array(cube.located, 'uint8'),
+        # days since 1970-01-01
+        'dates': typed_array(cube.dates.astype('datetime64[D]').astype(np.int64), 'int32'),
+        # most datasets have a row for every location and every day
+        'present': None if cube.present.all() else typed_array(cube.present, 'uint8'),
+        'config': config or {},
+    }
+    for i, metric in enumerate(METRICS):
+        encoded[metric] = typed_array(cube.values[:, :, i], 'int32')
+    return encoded
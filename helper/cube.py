@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+
+from helper.data_model import ordinal_dates
+
+
+LOCATION_COLUMNS = ['Lat', 'Long', 'State']
+METRICS = ['Confirmed', 'Death']
+
+
+class Cube:
+    """
+        >> ATTRIBUTES <<
+        ---------------------------------------------------------------------------------------------
+            * locations: dataframe (Lat, Long, State), one row per location, sorted like a groupby
+            * dates: sorted datetime64 array, one entry per day of the dataset
+            * values: locations x dates x METRICS array of cumulative counts, the days without
+              a row repeat the previous count
+            * present: locations x dates boolean array, False where the dataset has no row
+
+        >> OUTPUT <<
+        -------------------------------------------------------
+        Dense version of the CompactData of the dataset. Filtering by country or
+        by dates is an index lookup and the cases in a window are computed for every
+        location at once, with the same results as data_preparation.filter_df and
+        data_preparation.sumurize_by_country.
+    """
+
+    def __init__(self, data):
+        # groupby order: sorted on Lat, Long then State, the missing coordinates last
+        locations = data.locations[LOCATION_COLUMNS].astype({'State': object})
+        order = locations.sort_values(LOCATION_COLUMNS, kind='mergesort', na_position='last').index
+        rank = np.empty(len(order), dtype=np.int32)
+        rank[order] = np.arange(len(order), dtype=np.int32)
+        codes = rank[data.facts['location'].to_numpy()]
+        self.locations = locations.iloc[order].reset_index(drop=True)
+        self.states = self.locations['State'].to_numpy()
+        # groupby ignores the locations without coordinates
+        self.located = self.locations[['Lat', 'Long']].notna().all(axis=1).to_numpy()
+
+        days, date_codes = np.unique(data.facts['day'].to_numpy(), return_inverse=True)
+        self.dates = ordinal_dates(days)
+
+        shape = (len(self.locations), len(self.dates))
+        self.values = np.zeros(shape + (len(METRICS),),
+                               dtype=np.result_type(*data.facts[METRICS].dtypes))
+        self.values[codes, date_codes] = data.facts[METRICS].to_numpy()
+        self.present = np.zeros(shape, dtype=bool)
+        self.present[codes, date_codes] = True
+        if not self.present.all():
+            self.values = fill_gaps(self.values, self.present)
+
+    # index lookups
+    # ____________________________________________________________
+    def select(self, countries=None):
+        """Boolean mask of the locations kept by filter_by_country"""
+        if countries:
+            return np.isin(self.states, countries)
+        return np.ones(len(self.states), dtype=bool)
+
+    def window(self, time_range, selection=None):
+        """Index of the first date kept by filter_by_dates"""
+        if selection is None:
+            selection = self.select()
+        if time_range == 0 or not selection.any():
+            return 0
+        last_day = np.flatnonzero(self.present[selection].any(axis=0))[-1]
+        # longer than the dates: all of them, without overflowing datetime64[ns]
+        if time_range > (self.dates[last_day] - self.dates[0]) // np.timedelta64(1, 'D'):
+            return 0
+        first_day = self.dates[last_day] - np.timedelta64(time_range, 'D')
+        return int(np.searchsorted(self.dates, first_day, side='right'))
+
+    # aggregations
+    # ____________________________________________________________
+    def summarize(self, countries=None, time_range=0):
+        """Same as sumurize_by_country(filter_df(df, countries, time_range))"""
+        selection = self.select(countries)
+        start = self.window(time_range, selection)
+
+        present = self.present[:, start:]
+        keep = selection & self.located & present.any(axis=1)
+        present = present[keep, :, None]
+        values = self.values[keep, start:]
+
+        if np.issubdtype(values.dtype, np.integer):
+            info = np.iinfo(values.dtype)
+        else:
+            info = np.finfo(values.dtype)
+        cases = (values.max(axis=1, where=present, initial=info.min)
+                 - values.min(axis=1, where=present, initial=info.max))
+
+        summary = self.locations[keep].reset_index(drop=True)
+        summary['Death'] = cases[:, METRICS.index('Death')]
+        summary['Confirmed'] = cases[:, METRICS.index('Confirmed')]
+        return summary
+
+    def cumulative(self, countries=None, time_range=0, metric='Confirmed'):
+        """Dates x States frame of the counts of filter_df(df, countries, time_range), summed
+        over the locations of a State"""
+        selection = self.select(countries)
+        start = self.window(time_range, selection)
+        states, codes = np.unique(self.states[selection], return_inverse=True)
+
+        counts = self.values[selection, start:, METRICS.index(metric)]
+        if len(states) < len(codes):
+            by_state = np.zeros((len(states), counts.shape[1]), dtype=counts.dtype)
+            np.add.at(by_state, codes, counts)
+            counts = by_state
+        else:
+            counts = counts[np.argsort(codes)]
+        return pd.DataFrame(counts.T,
+                            index=pd.DatetimeIndex(self.dates[start:], name='Date'),
+                            columns=pd.Index(states, name='State'))
+
+    def daily_cases(self, countries=None, time_range=0):
+        """Dates x States frame of get_daily_case(filter_df(df, countries, time_range)),
+        summed over the locations of a State"""
+        selection = self.select(countries)
+        start = self.window(time_range, selection)
+        states, codes = np.unique(self.states[selection], return_inverse=True)
+
+        counts = self.values[selection, start:, METRICS.index('Confirmed')]
+        # the days without a row repeat the previous count: the next row gets the whole jump
+        daily = np.maximum(np.diff(counts, axis=1, prepend=counts[:, :1]), 0)
+        # no previous row in the window: the first row of every location is 0
+        present = self.present[selection, start:]
+        seen = present.any(axis=1)
+        daily[seen, present[seen].argmax(axis=1)] = 0
+
+        by_state = np.zeros((len(states), daily.shape[1]))
+        np.add.at(by_state, codes, daily)
+        return pd.DataFrame(by_state.T,
+                            index=pd.DatetimeIndex(self.dates[start:], name='Date'),
+                            columns=pd.Index(states, name='State'))
+
+
+def fill_gaps(values, present):
+    # carry the last known count forward, and the first one backward
+    days = np.arange(present.shape[1])
+    last_seen = np.maximum.accumulate(np.where(present, days, -1), axis=1)
+    first_seen = present.argmax(axis=1)[:, None]
+    source = np.where(last_seen < 0, first_seen, last_seen)
+    return np.take_along_axis(values, source[..., None], axis=1)
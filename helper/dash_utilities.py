@@ -1,24 +1,52 @@
-from dash.dependencies import Output, Input, State
+from dash.dependencies import Output, Input, State, ClientsideFunction
+from dash.exceptions import PreventUpdate
 import dash_html_components as html
 import dash_core_components as dcc
 import dash_bootstrap_components as dbc
 import dash
-import numpy as np
 
 # PLOTLY
-import plotly.express as px
 import plotly.io as pio
 pio.templates.default = "plotly_white"
 
+# how often the lazy cards look whether they were scrolled into view, in ms
+LAZY_POLL = 250
+
 
 class Card:
-    def __init__(self, Id=None, graph=None, title=None, tooltip=None, zoom=False,  dash_config={'displayModeBar': False, 'showAxisDragHandles': False}):
+    """
+        >> ATTRIBUTES <<
+        ---------------------------------------------------------------------------------------------
+            * Id, graph, title, tooltip, zoom, dash_config: graph of the card and its header
+            * priority: loading order, the cards of a priority request their data once the
+              cards and the header of the previous priority got theirs (Container.callback)
+            * lazy: only request the data once the card is scrolled into view
+            * data: (id, property) filled by the callback of the card, (Id, 'figure') by default
+            * className: the card is the bare graph with this class, laid out by the
+              stylesheet of the app, instead of a bootstrap card with a header
+
+        >> OUTPUT <<
+        -------------------------------------------------------
+        A graph of the dashboard
+    """
+
+    def __init__(self, Id=None, graph=None, title=None, tooltip=None, zoom=False,  dash_config={'displayModeBar': False, 'showAxisDragHandles': False},
+                 priority=0, lazy=False, data=None, className=None):
         #  graph
         self.graph = dcc.Graph(config=dash_config, style={"width": "100%"})
         if Id:
             self.graph.id = Id
         if graph:
             self.graph.figure = graph
+        self.className = className
+        if className:
+            self.graph.className = className
+
+        # loading
+        self.id = Id
+        self.priority = priority
+        self.lazy = lazy
+        self.data = data or (Id, 'figure')
         # header
         self.header = []
         self.title = title
@@ -76,6 +104,8 @@ class Card:
     # create the card
     # ____________________________________________________________
     def create(self):
+        if self.className:
+            return self.graph
         return html.Div(
             [
                 self.create_header(),
@@ -99,6 +129,12 @@ class Header:
         ---------------------------------------------------------------------------------------------
                 * title: title of the dashboard
             * elm:  elements inside the side bars
+            * report: component under the elements filled by a callback (a counter), it is
+              loaded before the cards (priority 0)
+            * data: (id, property) filled by the callback of the report, (report id, 'children')
+              by default
+            * className: the header is a plain block with this class, laid out by the
+              stylesheet of the app, instead of the bootstrap bars
             * header: header 
 
         >> OUTPUT <<
@@ -106,9 +142,17 @@ class Header:
         Create the header of the dash
     """
 
-    def __init__(self, title, elm=False):
+    def __init__(self, title, elm=False, report=None, data=None, className=None):
         self.title = title
         self.elm = elm
+        self.report = report
+        self.className = className
+
+        # loading
+        self.id = report.id if report is not None else None
+        self.priority = 0
+        self.lazy = False
+        self.data = data or ((self.id, 'children') if report is not None else None)
         self.header = self.create()
 
     # create header
@@ -125,9 +169,14 @@ class Header:
         return sub
 
     def create(self):
+        if self.className:
+            return html.Div([self.title] + list(self.elm or []) + ([self.report] if self.report is not None else []),
+                            className=self.className)
         header = html.Div([self.main()])
         if self.elm:
             header.children.append(self.sub())
+        if self.report is not None:
+            header.children.append(self.report)
         return header
 
 
@@ -139,16 +188,25 @@ class Container:
                 * row_dim: list of string which describe the height of each row
             * margin: set the margin between the cards (0<=int<=5, default=4)
             * backgorund_color: color of the background ( str, default="white")
+            * className: class of the block of the rows (one `row_<n>` div per row), laid out
+              by the stylesheet of the app, instead of bootstrap rows
 
         >> OUTPUT <<
         -------------------------------------------------------
-        Create the panel where we organise all our cards. This is the core of our dashboard
+        Create the panel where we organise all our cards. This is the core of our dashboard.
+        The header report and the cards are loaded by priority: a stage store `loaded_<p>`
+        changes when the ones of priority p got their data, and the callbacks of the next
+        priority wait for it (Container.callback). A lazy card waits until it is scrolled
+        into view (`<id>_visible`) and the previous stage is loaded (`<id>_ready`).
     """
 
-    def __init__(self, cards, header=None, background_color="#fafafa"):
+    def __init__(self, cards, header=None, background_color="#fafafa", className=None):
         self.cards = cards
-        self.header = header
+        self.header = header.header if isinstance(header, Header) else header
         self.background_color = background_color
+        self.className = className
+        self.loading = [unit for unit in ([header] if isinstance(header, Header) else []) + list(cards)
+                        if unit.data is not None]
 
     def info(self):
         print("CONTAINER:")
@@ -164,6 +222,8 @@ class Container:
 
     def row(self, n):
         cards = [card for card in self.cards if card.row_number == n]
+        if self.className:
+            return html.Div([card.create() for card in cards], id=f'row_{n}')
         row = dbc.Row(
             children=[],
             style={"background-color": self.background_color},
@@ -180,12 +240,97 @@ class Container:
             [], style={"height": height, "background-color": self.background_color})
         if self.header:
             container.children.append(self.header)
-        for row in range(n_row):
-            container.children.append(self.row(row+1))
+        if self.className:
+            container.children.append(html.Div([self.row(row+1) for row in range(n_row)],
+                                               className=self.className))
+        else:
+            for row in range(n_row):
+                container.children.append(self.row(row+1))
+        container.children.extend(self.loading_stores())
         return container
 
+    # progressive loading
+    # ____________________________________________________________
+    def stages(self):
+        """Priorities with units loaded after them"""
+        eager = sorted({unit.priority for unit in self.loading if not unit.lazy})
+        last = max(unit.priority for unit in self.loading) if self.loading else None
+        return [priority for priority in eager if priority < last]
+
+    def gate(self, unit):
+        """Stage store the unit waits for, None for the first priority"""
+        previous = [priority for priority in self.stages() if priority < unit.priority]
+        return f'loaded_{previous[-1]}' if previous else None
+
+    def lazy(self):
+        return [unit for unit in self.loading if unit.lazy]
+
+    def gates(self):
+        """Ids of the stage and ready stores, the callbacks behind them only use whether
+        they are set"""
+        return [f'loaded_{priority}' for priority in self.stages()] + [f'{unit.id}_ready' for unit in self.lazy()]
+
+    def loading_stores(self):
+        stores = [dcc.Store(id=f'loaded_{priority}') for priority in self.stages()]
+        if self.lazy():
+            stores.append(dcc.Store(id='lazy_cards', data=[unit.id for unit in self.lazy()]))
+            stores.append(dcc.Interval(id='lazy_poll', interval=LAZY_POLL))
+            for unit in self.lazy():
+                stores += [dcc.Store(id=f'{unit.id}_visible'), dcc.Store(id=f'{unit.id}_ready')]
+        return stores
+
+    def register(self, app):
+        """Clientside callbacks of the stages and of the lazy cards (assets/clientside.js)"""
+        for priority in self.stages():
+            app.clientside_callback(
+                ClientsideFunction(namespace='cards', function_name='loaded'),
+                Output(f'loaded_{priority}', 'data'),
+                [Input(*unit.data) for unit in self.loading if unit.priority == priority and not unit.lazy])
+        lazy = self.lazy()
+        if not lazy:
+            return
+        app.clientside_callback(
+            ClientsideFunction(namespace='cards', function_name='visible'),
+            [Output(f'{unit.id}_visible', 'data') for unit in lazy] + [Output('lazy_poll', 'disabled')],
+            [Input('lazy_poll', 'n_intervals')],
+            [State('lazy_cards', 'data')] + [State(f'{unit.id}_visible', 'data') for unit in lazy])
+        for unit in lazy:
+            gate = self.gate(unit)
+            app.clientside_callback(
+                ClientsideFunction(namespace='cards', function_name='ready'),
+                Output(f'{unit.id}_ready', 'data'),
+                [Input(f'{unit.id}_visible', 'data')] + ([Input(gate, 'data')] if gate else []))
+
+    def callback(self, app, unit, outputs, inputs, state=()):
+        """Register the server callback of a card or of the header report, behind its stage.
+        The function only gets the values of inputs and state.
+
+        A lazy card is only called when it is ready: its inputs are sent as states and its
+        ready store is its only input, which changes with the previous stage."""
+        state = list(state)
+        if unit.lazy:
+            state = [State(i.component_id, i.component_property) for i in inputs] + state
+            inputs, gates = [], [Input(f'{unit.id}_ready', 'data')]
+        else:
+            gate = self.gate(unit)
+            gates = [Input(gate, 'data')] if gate else []
+
+        def register(function):
+            n_inputs, n_gates = len(inputs), len(gates)
+
+            def load(*args):
+                if unit.lazy and not args[0]:
+                    raise PreventUpdate
+                return function(*args[:n_inputs], *args[n_inputs + n_gates:])
+            app.callback(outputs, list(inputs) + gates, state, prevent_initial_call=unit.lazy)(load)
+            return function
+        return register
+
 
 if __name__ == '__main__':
+    # pandas is only imported by the demo
+    import plotly.express as px
+
     external_stylesheets = [dbc.themes.BOOTSTRAP, "assets/test.css"]
     app = dash.Dash(__name__, external_stylesheets=external_stylesheets)
     server = app.server
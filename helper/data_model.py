@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+
+
+LOCATION_KEYS = ['State', 'Lat', 'Long']
+COUNTS = ['Confirmed', 'Death', 'Recovered']
+
+
+def day_ordinals(dates):
+    """Days since 1970-01-01 as int32"""
+    return np.asarray(dates, dtype='datetime64[D]').astype(np.int32)
+
+
+def ordinal_dates(days):
+    return np.asarray(days, dtype=np.int64).astype('datetime64[D]').astype('datetime64[ns]')
+
+
+def compact_counts(values):
+    # int32 unless a count doesn't fit
+    info = np.iinfo(np.int32)
+    if len(values) and (values.min() < info.min or values.max() > info.max):
+        return values.astype(np.int64)
+    return values.astype(np.int32)
+
+
+class CompactData:
+    """
+        >> ATTRIBUTES <<
+        ---------------------------------------------------------------------------------------------
+            * locations: dataframe (State as a categorical, Lat, Long), one row per location in the
+              order of their first row in the long dataset
+            * facts: dataframe (location: int32 row of `locations`, day: int32 days since 1970-01-01,
+              Confirmed, Death and Recovered when collected: int32 counts), one row per location
+              and per day, in the order of the long dataset
+
+        >> OUTPUT <<
+        -------------------------------------------------------
+        Normalized version of the long dataset produced by collect_data: the State strings and the
+        coordinates repeated on every row are stored once per location. The functions of
+        data_preparation and the Cube work on the location codes. Must be treated as read-only.
+    """
+
+    def __init__(self, locations, facts):
+        self.locations = locations
+        self.facts = facts
+
+    @classmethod
+    def from_long(cls, df):
+        codes = df.groupby(LOCATION_KEYS, sort=False, dropna=False).ngroup().to_numpy(dtype=np.int32)
+        first_rows = np.unique(codes, return_index=True)[1]
+        locations = df[LOCATION_KEYS].iloc[first_rows].reset_index(drop=True)
+        locations['State'] = locations['State'].astype('category')
+
+        facts = pd.DataFrame({'location': codes, 'day': day_ordinals(df['Date'])})
+        for metric in COUNTS:
+            if metric in df:
+                facts[metric] = compact_counts(df[metric].to_numpy())
+        return cls(locations, facts)
+
+    @property
+    def metrics(self):
+        return [metric for metric in COUNTS if metric in self.facts]
+
+    def codes(self, countries):
+        """Codes of the locations of the countries"""
+        return np.flatnonzero(self.locations['State'].isin(countries)).astype(np.int32)
+
+    def take(self, mask):
+        """Same locations, facts where mask is True"""
+        return CompactData(self.locations, self.facts[mask])
+
+    def to_long(self):
+        """Long frame (State, Lat, Long, Date and counts) of the facts"""
+        codes = self.facts['location'].to_numpy()
+        df = self.locations.iloc[codes].reset_index(drop=True)
+        df['State'] = df['State'].astype(object)
+        df['Date'] = ordinal_dates(self.facts['day'])
+        for metric in self.metrics:
+            df[metric] = self.facts[metric].to_numpy()
+        return df
+
+    def memory_usage(self):
+        """Bytes held by the locations and the facts"""
+        return {'locations': int(self.locations.memory_usage(index=True, deep=True).sum()),
+                'facts': int(self.facts.memory_usage(index=True, deep=True).sum())}
@@ -1,36 +1,78 @@
+import numpy as np
 import pandas as pd
 
+from helper.data_model import ordinal_dates
 
-def filter_df(df, countries, time_range):
-    df = filter_by_country(df, countries)
-    return filter_by_dates(df, time_range)
 
+def filter_df(data, countries, time_range):
+    data = filter_by_country(data, countries)
+    return filter_by_dates(data, time_range)
 
-def filter_by_country(df, countries):
+
+def filter_by_country(data, countries):
     if countries:
-        return df[df['State'].isin(countries)]
+        return data.take(np.isin(data.facts['location'].to_numpy(), data.codes(countries)))
     else:
-        return df
+        return data
 
 
-def filter_by_dates(df, time_range):
-    if time_range != 0:
-        last_day = df['Date'].max()
-        time_range = last_day - pd.Timedelta(days=time_range)
-        return df[df['Date'] > time_range]
+def filter_by_dates(data, time_range):
+    days = data.facts['day'].to_numpy()
+    # no facts: no last day, nothing to filter
+    if time_range != 0 and len(days):
+        return data.take(days > days.max() - time_range)
     else:
-        return df
+        return data
 
 
-def sumurize_by_country(df):
+def sumurize_by_country(data):
     usefull_columns = ['Death', 'Confirmed']
-    df = df.groupby(['Lat', 'Long', 'State']).apply(
-        lambda x: x.max() - x.min())
-    return df.loc[:, usefull_columns].reset_index()
+    counts = data.facts.groupby('location')[usefull_columns]
+    cases = counts.max() - counts.min()
+    df = data.locations.iloc[cases.index].reset_index(drop=True)
+    df['State'] = df['State'].astype(object)
+    df[usefull_columns] = cases.to_numpy()
+    # as a groupby on Lat, Long and State: sorted, without the locations missing coordinates
+    df = df.dropna(subset=['Lat', 'Long'])
+    df = df.sort_values(['Lat', 'Long', 'State'], kind='mergesort', ignore_index=True)
+    return df[['Lat', 'Long', 'State'] + usefull_columns]
 
 
-def get_daily_case(df):
-    daily_cases = df.set_index(['Date', 'State'])
-    daily_cases = daily_cases['Confirmed'].groupby('State').diff().fillna(0)
+def get_daily_case(data):
+    """Daily new cases, clamped at 0, indexed by Date and State. The differences are taken
+    by location: unlike the groupby on State of the long frame, the locations sharing a
+    State name are not chained"""
+    facts = data.facts
+    daily_cases = facts.groupby('location')['Confirmed'].diff().fillna(0)
     daily_cases[daily_cases < 0] = 0
-    return daily_cases
+    daily_cases.index = pd.MultiIndex.from_arrays(
+        [ordinal_dates(facts['day']), data.locations['State'].to_numpy()[facts['location']]],
+        names=['Date', 'State'])
+    return daily_cases.rename('Confirmed')
+
+
+def get_evolution(data, metric='Confirmed'):
+    """Sum of the metric by Date and State, indexed by State
+    (df.groupby(['Date', 'State']).sum().reset_index(level='Date') on the long frame)"""
+    facts = data.facts
+    states = data.locations['State'].cat.codes.to_numpy()[facts['location']]
+    evolution = facts[metric].groupby([facts['day'].to_numpy(), states]).sum()
+    days, codes = evolution.index.get_level_values(0), evolution.index.get_level_values(1)
+    return pd.DataFrame({'Date': ordinal_dates(days), metric: evolution.to_numpy()},
+                        index=pd.Index(data.locations['State'].cat.categories[codes], name='State'))
+
+
+def rolling_mean(df, window=7, min_periods=3):
+    """Same as df.rolling(window, min_periods).mean() for a gapless frame or series,
+    computed for every column at once from a cumulative sum"""
+    values = df.to_numpy(dtype=float)
+    totals = np.cumsum(values, axis=0)
+    totals[window:] -= totals[:-window].copy()
+
+    counts = np.minimum(np.arange(1, len(values) + 1), window)
+    means = totals / counts.reshape((-1,) + (1,) * (values.ndim - 1))
+    means[counts < min_periods] = np.nan
+
+    if isinstance(df, pd.Series):
+        return pd.Series(means, index=df.index, name=df.name)
+    return pd.DataFrame(means, index=df.index, columns=df.columns)
@@ -0,0 +1,152 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import namedtuple
+
+from helper.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+Snapshot = namedtuple('Snapshot', ['version', 'data', 'cube', 'derived'])
+
+
+def columnar_path(saving_path):
+    return os.path.splitext(saving_path)[0] + '.feather'
+
+
+def replace_atomically(saving_path, write):
+    # write next to the target then rename, readers never see a partial file
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(saving_path)), suffix='.tmp')
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, saving_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def read_dataset(path):
+    if path.endswith('.feather'):
+        return read_columnar(path)
+    # pandas is only imported with the first load, not when the app boots
+    import pandas as pd
+    return pd.read_csv(path, parse_dates=['Date'])
+
+
+def read_columnar(path):
+    # memory-mapped: the columns are read without a copy or a decompression. The long frame
+    # is only kept until it is normalized, CompactData and the Cube are private copies
+    from pyarrow import feather
+    table = feather.read_table(path, memory_map=True)
+    return table.to_pandas(split_blocks=True)
+
+
+def file_digest(path, chunk_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+class Dataset:
+    """
+        >> ATTRIBUTES <<
+        ---------------------------------------------------------------------------------------------
+            * path: file holding the collected dataset
+            * loader: function turning the file into a dataframe (default: read_dataset)
+
+        >> OUTPUT <<
+        -------------------------------------------------------
+        Keep one parsed snapshot of the dataset, as a CompactData, its Cube and its derived
+        series (helper/derived.py), in memory. The file is only parsed again
+        when its content changes (mtime/size first, then a content hash), and the new
+        snapshot replaces the old one in a single assignment, so a request that already
+        holds a snapshot keeps a consistent frame. The snapshot must be treated as read-only.
+        Only the first load is waited for: a new version is built in a background thread
+        while get keeps returning the current snapshot.
+    """
+
+    def __init__(self, path, loader=read_dataset):
+        self.path = path
+        self.loader = loader
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._snapshot = None
+
+    def _stat(self):
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def changed(self):
+        try:
+            return self._stat() != self._stamp
+        except OSError:
+            # the file is being replaced
+            return False
+
+    def refresh(self, wait=True):
+        """Reload the file if it changed, return True when a new snapshot was swapped in.
+        Without wait, return False at once when another thread is already loading it."""
+        if not self._lock.acquire(blocking=wait):
+            return False
+        try:
+            stamp = self._stat()
+            if stamp == self._stamp:
+                return False
+            version = file_digest(self.path)
+            if self._snapshot is not None and version == self._snapshot.version:
+                self._stamp = stamp
+                return False
+            from helper.cube import Cube
+            from helper.data_model import CompactData
+            from helper.derived import Derived
+            with metrics.span('dataset.load'):
+                # the long frame is only kept until it is normalized
+                data = CompactData.from_long(self.loader(self.path))
+                cube = Cube(data)
+            with metrics.span('dataset.derive'):
+                # the series every request used to recompute, once per version
+                self._snapshot = Snapshot(version, data, cube, Derived(cube))
+            # the file was replaced while loading: check it again on the next call
+            self._stamp = stamp if self._stat() == stamp else None
+            return True
+        finally:
+            self._lock.release()
+
+    def _refresh_in_background(self):
+        try:
+            stamp = self._stat()
+        except OSError:
+            # the file is being replaced: tried again by a later request
+            return
+        try:
+            self.refresh(wait=False)
+        except Exception:
+            logger.exception('dataset reload failed, keep serving version %s', self._snapshot.version)
+            # not tried again before the file changes
+            self._stamp = stamp
+
+    def get(self):
+        if self._snapshot is None:
+            # nothing to serve yet: every request waits for the first load
+            self.refresh()
+        elif self.changed() and not self._lock.locked():
+            threading.Thread(target=self._refresh_in_background, name='dataset-reload', daemon=True).start()
+        return self._snapshot
+
+    @property
+    def version(self):
+        return self.get().version
+
+    @property
+    def data(self):
+        return self.get().data
+
+    @property
+    def cube(self):
+        return self.get().cube
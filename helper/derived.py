@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+
+from helper.cube import METRICS
+from helper.data_preparation import rolling_mean
+from helper.utils import prettify_number
+
+# values of the time_dropdown
+PRESETS = [0, 90, 30, 15]
+
+
+class Derived:
+    """
+        >> ATTRIBUTES <<
+        ---------------------------------------------------------------------------------------------
+            * cube: Cube of the dataset version
+            * presets: time ranges whose views are materialized
+
+        >> OUTPUT <<
+        -------------------------------------------------------
+        Series derived from the dataset, computed once when a dataset version is loaded
+        instead of on every request:
+            * daily: States x dates array of the daily new cases of every location, clamped
+              at 0 and summed by State (get_daily_case), the first row of every location in
+              a window is then set to 0
+            * for every preset of the time dropdown, without a selection: the cases of every
+              location (summary), the worldwide daily cases and their 7-day rolling mean
+              (world), the top 10 locations with their death rates (top10)
+        summarize and daily_cases have the signatures and the results of the Cube methods,
+        other time ranges and selections ending before the last day are computed by the Cube.
+    """
+
+    def __init__(self, cube, presets=PRESETS):
+        self.cube = cube
+        self.states, self.codes = np.unique(cube.states, return_inverse=True)
+        confirmed = cube.values[:, :, METRICS.index('Confirmed')]
+        # clamped per location, as get_daily_case, before the sum by State
+        daily = np.maximum(np.diff(confirmed, axis=1, prepend=confirmed[:, :1]), 0)
+        self.daily = np.zeros((len(self.states), daily.shape[1]), dtype=daily.dtype)
+        np.add.at(self.daily, self.codes, daily)
+
+        self.starts = {time_range: cube.window(time_range) for time_range in presets}
+        self.summaries = {time_range: cube.summarize(None, time_range) for time_range in presets}
+        self.worlds = {time_range: rolling_mean(self.daily_cases(None, time_range).sum(axis=1))
+                       for time_range in presets}
+        self.tops = {time_range: top10(summary) for time_range, summary in self.summaries.items()}
+
+    def preset(self, countries, time_range):
+        """Preset of the time range when the window of the selection is the one of the preset"""
+        if time_range not in self.starts:
+            return None
+        if countries and self.cube.window(time_range, self.cube.select(countries)) != self.starts[time_range]:
+            return None
+        return time_range
+
+    def summarize(self, countries=None, time_range=0):
+        """Same as Cube.summarize"""
+        if self.preset(countries, time_range) is None:
+            return self.cube.summarize(countries, time_range)
+        summary = self.summaries[time_range]
+        if countries:
+            return summary[summary['State'].isin(countries)].reset_index(drop=True)
+        return summary.copy()
+
+    def daily_cases(self, countries=None, time_range=0):
+        """Same as Cube.daily_cases"""
+        selection = self.cube.select(countries)
+        start = self.cube.window(time_range, selection)
+        rows = np.searchsorted(self.states, np.unique(self.cube.states[selection]))
+        daily = self.daily[rows, start:].T.astype(float)
+        # no previous row in the window: remove the first jump of every location
+        present = self.cube.present[selection, start:]
+        seen = present.any(axis=1)
+        locations = np.flatnonzero(selection)[seen]
+        first = start + present[seen].argmax(axis=1)
+        confirmed = self.cube.values[:, :, METRICS.index('Confirmed')]
+        jumps = np.maximum(confirmed[locations, first] - confirmed[locations, np.maximum(first - 1, 0)], 0)
+        columns = np.searchsorted(self.states[rows], self.states[self.codes[locations]])
+        np.subtract.at(daily, (first - start, columns), jumps)
+        return pd.DataFrame(daily,
+                            index=pd.DatetimeIndex(self.cube.dates[start:], name='Date'),
+                            columns=pd.Index(self.states[rows], name='State'))
+
+    def cumulative(self, countries=None, time_range=0, metric='Confirmed'):
+        return self.cube.cumulative(countries, time_range, metric)
+
+    def world(self, time_range):
+        """7-day rolling mean of the worldwide daily cases"""
+        if time_range in self.worlds:
+            return self.worlds[time_range]
+        return rolling_mean(self.daily_cases(None, time_range).sum(axis=1))
+
+    def top10(self, time_range):
+        if time_range in self.tops:
+            return self.tops[time_range]
+        return top10(self.cube.summarize(None, time_range))
+
+
+def top10(summary):
+    """The 10 locations with the most cases, fewest first, with their death rates in percent
+    and the labels of the 3 largest bars"""
+    top = summary.nlargest(10, 'Confirmed').sort_values('Confirmed')
+    labels = [None] * len(top)
+    labels[-3:] = top['Confirmed'][-3:]
+    top['label'] = pd.Series([prettify_number(x) for x in labels], index=top.index, dtype=object)
+    top['death_rate'] = (top['Death'] / top['Confirmed']) * 100
+    return top
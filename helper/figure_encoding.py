@@ -0,0 +1,136 @@
+import base64
+import datetime
+import os
+
+import numpy as np
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+# Significant digits kept for the float arrays of each trace type, by attribute. The
+# hovers show 2 or 3 digits, the extra digits keep the rounding of the hovers the same
+# in almost every case; 7 digits for the coordinates is under 10 meters. Integer arrays
+# are never rounded.
+PRECISION = {
+    'scattermapbox': {'lat': 7, 'lon': 7, 'marker.size': 4},
+    'scatter': {'y': 5, 'customdata': 5},
+    'bar': {'x': 6, 'customdata': 6},
+}
+# float arrays rounded to this many digits or less are sent as float32
+FLOAT32_DIGITS = 7
+
+# Base64 typed arrays ({'dtype', 'bdata'}) are only understood by plotly.js 2.28 and
+# later, the plotly.js of Dash 1.21 needs plain lists
+TYPED_ARRAYS = os.environ.get('FIGURE_TYPED_ARRAYS', '0') == '1'
+ARRAY_ATTRIBUTES = ['x', 'y', 'lat', 'lon', 'customdata', 'marker.size']
+
+
+def round_significant(values, digits):
+    """Round the values to a number of significant digits"""
+    values = np.asarray(values, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        magnitude = np.floor(np.log10(np.abs(values)))
+    decimals = np.where(np.isfinite(magnitude), digits - 1 - magnitude, 0)
+    # dividing by a power of ten keeps the shortest repr of the rounded values
+    scale = 10. ** np.abs(decimals)
+    return np.where(decimals >= 0, np.round(values * scale) / scale, np.round(values / scale) * scale)
+
+
+def as_dates(values):
+    """datetime64[ms] of a list of dates, None when the values are not dates"""
+    if isinstance(values, np.ndarray):
+        return values.astype('datetime64[ms]') if np.issubdtype(values.dtype, np.datetime64) else None
+    if len(values) and isinstance(values[0], (datetime.date, np.datetime64)):
+        return np.array(values, dtype='datetime64[ms]')
+    return None
+
+
+def plotly_typed_array(values, digits=None):
+    """plotly.js typed array spec ({dtype, bdata}), float32 and int32 when lossless enough.
+    Not the {dtype, data} arrays of helper/clientside.typed_array, decoded by assets/clientside.js"""
+    if np.issubdtype(values.dtype, np.integer):
+        info = np.iinfo(np.int32)
+        fits = values.size == 0 or (values.min() >= info.min and values.max() <= info.max)
+        dtype = 'i4' if fits else 'f8'
+    else:
+        dtype = 'f4' if digits is not None and digits <= FLOAT32_DIGITS else 'f8'
+    encoded = {'dtype': dtype,
+               'bdata': base64.b64encode(np.ascontiguousarray(values, dtype='<' + dtype).tobytes()).decode()}
+    if values.ndim > 1:
+        encoded['shape'] = ','.join(map(str, values.shape))
+    return encoded
+
+
+def get_path(container, path):
+    for name in path.split('.'):
+        if not isinstance(container, dict) or name not in container:
+            return None
+        container = container[name]
+    return container
+
+
+def set_path(container, path, value):
+    *parents, name = path.split('.')
+    for parent in parents:
+        container = container[parent]
+    container[name] = value
+
+
+def encode_dates(trace, layout, values):
+    # a daily series is sent as its first day and a step, the others as epoch milliseconds
+    steps = np.diff(values.astype(np.int64))
+    if len(values) > 1 and (steps == DAY_MS).all():
+        del trace['x']
+        trace['x0'] = str(values[0].astype('datetime64[D]'))
+        trace['dx'] = DAY_MS
+    else:
+        trace['x'] = values.astype(np.int64)
+    # numbers are only read as dates on an axis typed as date
+    axis = 'xaxis' + trace.get('xaxis', 'x')[1:]
+    layout[axis] = dict({'type': 'date'}, **layout.get(axis, {}))
+
+
+def prune_template(layout, trace_types):
+    """Keep the trace defaults of the template for the trace types of the figure only"""
+    template = layout.get('template')
+    if isinstance(template, dict) and 'data' in template:
+        data = {name: value for name, value in template['data'].items() if name in trace_types}
+        layout['template'] = dict(template, data=data)
+
+
+def encode_figure(figure, precision=None, typed_arrays=None):
+    """
+        Compact copy of a figure dict (fig.to_dict()) for the callback outputs: the float
+        arrays are rounded with the precision policy of their trace type, the daily date
+        axes become x0/dx, the numeric arrays are base64 typed arrays when typed_arrays and
+        the template only keeps the defaults of the trace types used.
+    """
+    precision = PRECISION if precision is None else precision
+    typed_arrays = TYPED_ARRAYS if typed_arrays is None else typed_arrays
+    figure = dict(figure, layout=dict(figure.get('layout', {})))
+    traces = []
+    for trace in figure.get('data', []):
+        trace = {name: dict(value) if isinstance(value, dict) else value for name, value in trace.items()}
+        policy = precision.get(trace.get('type', 'scatter'), {})
+        for path in ARRAY_ATTRIBUTES:
+            values = get_path(trace, path)
+            if values is None or isinstance(values, (str, int, float)):
+                continue
+            dates = as_dates(values) if path == 'x' else None
+            if dates is not None:
+                encode_dates(trace, figure['layout'], dates)
+                continue
+            try:
+                values = np.asarray(values)
+            except ValueError:
+                # ragged arrays, like the locations of the map clusters
+                continue
+            if values.dtype.kind not in 'iuf':
+                continue
+            digits = policy.get(path)
+            if values.dtype.kind == 'f' and digits is not None:
+                values = round_significant(values, digits)
+            set_path(trace, path, plotly_typed_array(values, digits) if typed_arrays else values)
+        traces.append(trace)
+    figure['data'] = traces
+    prune_template(figure['layout'], {trace.get('type', 'scatter') for trace in traces})
+    return figure
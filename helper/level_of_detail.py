@@ -0,0 +1,112 @@
+import numpy as np
+
+# Web Mercator tiles of 256 pixels, the locations are clustered in cells of 32 pixels
+TILE_PIXELS = 256
+CELL_PIXELS = 32
+MAX_LEVEL = 16
+MAX_LATITUDE = 85.0511
+# above this number of locations the map is clustered
+MAX_MARKERS = 1000
+# size of the map in pixels when the browser doesn't report its bounds
+VIEWPORT = (1280, 800)
+DEFAULT_ZOOM = 0.5
+
+
+def world_pixels(lat, lon, level):
+    """Web Mercator coordinates in pixels of the world map at an integer zoom level"""
+    size = TILE_PIXELS * 2 ** level
+    lat = np.radians(np.clip(lat, -MAX_LATITUDE, MAX_LATITUDE))
+    x = (np.asarray(lon) + 180) / 360 * size
+    y = (1 - np.log(np.tan(lat) + 1 / np.cos(lat)) / np.pi) / 2 * size
+    return x, y
+
+
+def parse_view(relayout):
+    """Zoom and bounds (west, south, east, north) of the map from its relayoutData,
+    bounds is None when the map has not been moved"""
+    relayout = relayout or {}
+    zoom = relayout.get('mapbox.zoom')
+    if zoom is None:
+        return DEFAULT_ZOOM, None
+
+    derived = relayout.get('mapbox._derived') or {}
+    if derived.get('coordinates'):
+        lon, lat = np.array(derived['coordinates'], dtype=float).T
+        return zoom, (lon.min(), lat.min(), lon.max(), lat.max())
+
+    # estimate the bounds from the center and an usual size of the map
+    center = relayout.get('mapbox.center') or {'lon': 0, 'lat': 0}
+    x, y = world_pixels(center['lat'], center['lon'], zoom)
+    size = TILE_PIXELS * 2 ** zoom
+    west, east = [(x + dx) / size * 360 - 180 for dx in (-VIEWPORT[0] / 2, VIEWPORT[0] / 2)]
+    south, north = [np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + dy) / size))))
+                    for dy in (VIEWPORT[1] / 2, -VIEWPORT[1] / 2)]
+    return zoom, (west, south, east, north)
+
+
+def visible_tiles(zoom, bounds):
+    """Level and range of tiles (x0, y0, x1, y1) covering the bounds with a margin of one
+    tile, so that small moves of the map give the same tiles"""
+    level = int(np.clip(np.floor(zoom), 0, MAX_LEVEL))
+    last = 2 ** level - 1
+    if bounds is None:
+        return level, (0, 0, last, last)
+
+    west, south, east, north = bounds
+    (x0, x1), (y1, y0) = world_pixels(np.array([south, north]), np.array([west, east]), level)
+    x0, y0 = int(x0 // TILE_PIXELS) - 1, int(y0 // TILE_PIXELS) - 1
+    x1, y1 = int(x1 // TILE_PIXELS) + 1, int(y1 // TILE_PIXELS) + 1
+    if west < -180 or east > 180 or x1 < x0 or x1 - x0 >= last:
+        # the map shows the whole width of the world
+        x0, x1 = 0, last
+    return level, (max(x0, 0), max(y0, 0), min(x1, last), min(y1, last))
+
+
+def view_key(n_locations, relayout):
+    """Part of the cache key of the map, the same for all the views showing the same markers"""
+    if n_locations <= MAX_MARKERS:
+        return 'all'
+    level, tiles = visible_tiles(*parse_view(relayout))
+    return f"{level}:{','.join(map(str, tiles))}"
+
+
+def cluster_locations(summary, level):
+    """
+        Merge the locations of the summary (Lat, Long, State, Death, Confirmed) falling in the
+        same cell of CELL_PIXELS at the zoom level. Every location is in exactly one cluster so
+        the counts add up to the totals of the summary. The label of a cluster is its largest
+        location, its members are in Locations and its cell in CellX, CellY.
+    """
+    import pandas as pd
+    x, y = world_pixels(summary['Lat'].to_numpy(), summary['Long'].to_numpy(), level)
+    cells_per_axis = TILE_PIXELS // CELL_PIXELS * 2 ** level
+    cell_x = np.clip(x // CELL_PIXELS, 0, cells_per_axis - 1).astype(np.int64)
+    cell_y = np.clip(y // CELL_PIXELS, 0, cells_per_axis - 1).astype(np.int64)
+
+    # the largest location first, it labels the cluster
+    summary = summary.assign(cell=cell_y * cells_per_axis + cell_x)
+    summary = summary.sort_values(['cell', 'Confirmed'], ascending=[True, False], kind='mergesort')
+    cells = summary.groupby('cell', sort=True)
+    clusters = pd.DataFrame({
+        'Lat': cells['Lat'].mean(),
+        'Long': cells['Long'].mean(),
+        'State': cells['State'].first(),
+        'Death': cells['Death'].sum(),
+        'Confirmed': cells['Confirmed'].sum(),
+        'Locations': cells['State'].agg(list),
+    })
+    clusters['CellX'] = clusters.index % cells_per_axis
+    clusters['CellY'] = clusters.index // cells_per_axis
+    clusters = clusters.reset_index(drop=True)
+
+    size = clusters['Locations'].str.len()
+    clusters.loc[size > 1, 'State'] += ' +' + (size[size > 1] - 1).astype(str)
+    return clusters
+
+
+def in_tiles(clusters, tiles):
+    """Mask of the clusters whose cell is in the range of tiles (x0, y0, x1, y1)"""
+    x0, y0, x1, y1 = tiles
+    per_tile = TILE_PIXELS // CELL_PIXELS
+    return ((clusters['CellX'] >= x0 * per_tile) & (clusters['CellX'] < (x1 + 1) * per_tile)
+            & (clusters['CellY'] >= y0 * per_tile) & (clusters['CellY'] < (y1 + 1) * per_tile))
@@ -0,0 +1,183 @@
+import functools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+from flask import g, has_request_context, request
+
+QUANTILES = [0.5, 0.95, 0.99]
+
+
+class Summary:
+    """Count, sum and the last `window` observations of one series"""
+
+    def __init__(self, window):
+        self.values = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.
+
+    def observe(self, value):
+        self.values.append(value)
+        self.count += 1
+        self.total += value
+
+    def quantiles(self):
+        if not self.values:
+            return [float('nan')] * len(QUANTILES)
+        return np.quantile(np.fromiter(self.values, float), QUANTILES).tolist()
+
+
+class Metrics:
+    """
+        >> ATTRIBUTES <<
+        ---------------------------------------------------------------------------------------------
+            * window: number of recent observations the quantiles are computed on
+            * enabled: set METRICS=0 in the environment to turn the spans into no-ops
+
+        >> OUTPUT <<
+        -------------------------------------------------------
+        Timing spans and sizes aggregated per process into summaries (p50/p95/p99, sum, count),
+        rendered in the Prometheus text format.
+    """
+
+    def __init__(self, window=1024, enabled=True):
+        self.window = window
+        self.enabled = enabled
+        self._series = {}
+        self._help = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name, help_text):
+        self._help[name] = help_text
+
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            summary = self._series.get(key)
+            if summary is None:
+                summary = self._series[key] = Summary(self.window)
+            summary.observe(value)
+
+    @contextmanager
+    def span(self, stage):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('covid19_stage_seconds', time.perf_counter() - start, stage=stage)
+
+    def laps(self, prefix):
+        """Time consecutive stages without nesting: laps.lap('name') ends the current stage"""
+        return Laps(self, prefix)
+
+    def timed_callback(self, function):
+        """Time a Dash callback, the time is also kept on the request to split out serialization"""
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                self.observe('covid19_stage_seconds', elapsed, stage=function.__name__)
+                if has_request_context():
+                    g.callback_seconds = g.get('callback_seconds', 0.) + elapsed
+        return wrapper
+
+    def gauge(self, name, collect, kind='gauge'):
+        """collect() returns {labels tuple: value}, called when the metrics are rendered"""
+        self._gauges[name] = (collect, kind)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            series = sorted(self._series.items())
+            snapshot = [(name, labels, summary.quantiles(), summary.total, summary.count)
+                        for (name, labels), summary in series]
+
+        described = set()
+        for name, labels, quantiles, total, count in snapshot:
+            if name not in described:
+                described.add(name)
+                lines.append(f'# HELP {name} {self._help.get(name, name)}')
+                lines.append(f'# TYPE {name} summary')
+            for quantile, value in zip(QUANTILES, quantiles):
+                lines.append(f'{name}{format_labels(labels + (("quantile", quantile),))} {value}')
+            lines.append(f'{name}_sum{format_labels(labels)} {total}')
+            lines.append(f'{name}_count{format_labels(labels)} {count}')
+
+        for name, (collect, kind) in sorted(self._gauges.items()):
+            lines.append(f'# HELP {name} {self._help.get(name, name)}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in sorted(collect().items()):
+                lines.append(f'{name}{format_labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+class Laps:
+    def __init__(self, metrics, prefix):
+        self.metrics = metrics
+        self.prefix = prefix
+        self.last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.metrics.observe('covid19_stage_seconds', now - self.last, stage=f'{self.prefix}.{stage}')
+        self.last = now
+
+
+def instrument_callbacks(server, metrics, callback_map):
+    """Time the Dash callback requests and measure their payload, the time spent outside
+    of the callbacks (mostly the JSON serialization of the outputs) is the serialize stage.
+    The output label comes from the request: only the outputs of callback_map (app.callback_map)
+    are kept, any other one is 'unknown', so a client can't add series."""
+    @server.before_request
+    def start_timer():
+        if request.path.endswith('_dash-update-component'):
+            g.request_start = time.perf_counter()
+
+    @server.after_request
+    def record_request(response):
+        start = g.pop('request_start', None)
+        if start is None or not metrics.enabled:
+            return response
+        elapsed = time.perf_counter() - start
+        output = (request.get_json(silent=True) or {}).get('output')
+        if not isinstance(output, str) or output not in callback_map:
+            output = 'unknown'
+        metrics.observe('covid19_request_seconds', elapsed, output=output)
+        if 'callback_seconds' in g:
+            # not when the response was served without running the callback
+            metrics.observe('covid19_stage_seconds',
+                            max(elapsed - g.callback_seconds, 0.), stage='serialize')
+        if not response.direct_passthrough:
+            metrics.observe('covid19_payload_bytes', len(response.get_data()), output=output,
+                            encoding=response.headers.get('Content-Encoding', 'identity'))
+        return response
+
+
+def escape_label(value):
+    # backslash, double quote and line feed are escaped in the text format
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(f'{key}="{escape_label(value)}"' for key, value in labels)
+    return '{' + pairs + '}'
+
+
+metrics = Metrics(enabled=os.environ.get('METRICS', '1') != '0')
+metrics.describe('covid19_stage_seconds', 'Duration of the callback and data collection stages')
+metrics.describe('covid19_request_seconds', 'Duration of the Dash callback requests by output')
+metrics.describe('covid19_payload_bytes', 'Size of the Dash callback responses by output and content coding')
@@ -0,0 +1,92 @@
+import fcntl
+import logging
+import os
+import threading
+import time
+
+from helper.metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshScheduler:
+    """
+        >> ATTRIBUTES <<
+        ---------------------------------------------------------------------------------------------
+            * saving_path: file written by collect_data
+            * interval: maximum age of the file in seconds before it is collected again
+            * check_every: how often the background thread looks at the age of the file
+            * on_collected: called without arguments after this process collected new data
+            * options: keyword arguments of collect_data (url_confirmed, url_death, url_recovered,
+              url_us_confirmed, url_us_death, source_dir, incremental), a local path works as
+              well as an url
+
+        >> OUTPUT <<
+        -------------------------------------------------------
+        Run collect_data outside of the callbacks. Every gunicorn worker may start a scheduler,
+        an exclusive lock on `<saving_path>.lock` makes sure only one of them downloads. The new
+        files are renamed over the old ones, so the app keeps serving the previous snapshot
+        until the new one is complete.
+    """
+
+    def __init__(self, saving_path, interval=24*60*60, check_every=10*60, on_collected=None, **options):
+        self.saving_path = saving_path
+        self.interval = interval
+        self.check_every = check_every
+        self.on_collected = on_collected
+        self.options = options
+        self.lock_path = f'{saving_path}.lock'
+        self._stop = threading.Event()
+        self._thread = None
+
+    def due(self):
+        try:
+            age = time.time() - os.path.getmtime(self.saving_path)
+        except OSError:
+            return True
+        return age >= self.interval
+
+    def run_once(self, wait=False):
+        """Collect the data if it is due, return True if this process collected it"""
+        with open(self.lock_path, 'a') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # another worker is collecting
+                return False
+            try:
+                # the data may have been collected while we were waiting for the lock
+                if not self.due():
+                    return False
+                # pandas is only imported when the data is collected
+                from data.collect_data import collect_data
+                with metrics.span('collect_data'):
+                    collect_data(self.saving_path, **self.options)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        if self.on_collected is not None:
+            self.on_collected()
+        return True
+
+    def _run(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception('data collection failed, keep serving the current dataset')
+            if self._stop.wait(self.check_every):
+                return
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name='refresh-scheduler', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,86 @@
+import threading
+from collections import OrderedDict
+
+
+def normalize_selection(countries):
+    """Sorted tuple of the selected countries, the same selection gives the same key"""
+    return tuple(sorted(set(countries or [])))
+
+
+class ResultCache:
+    """
+        >> ATTRIBUTES <<
+        ---------------------------------------------------------------------------------------------
+            * cache: flask-caching Cache shared by the gunicorn workers (filesystem backend,
+              bounded by its CACHE_THRESHOLD)
+            * max_entries: size of the LRU kept in the memory of each worker
+            * timeout: lifetime of the shared entries in seconds
+
+        >> OUTPUT <<
+        -------------------------------------------------------
+        Two levels cache of the callback outputs. A key is looked up in the worker LRU, then in
+        the shared cache, and is only computed when both miss. The dataset version is part of
+        the key, so a new dataset never serves an old result.
+    """
+
+    def __init__(self, cache, max_entries=128, timeout=24*60*60, prefix='result'):
+        self.cache = cache
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.prefix = prefix
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {'local_hits': 0, 'shared_hits': 0, 'misses': 0, 'evictions': 0}
+
+    def make_key(self, version, countries, time_range, part=None):
+        """part: output of a callback among several cached for the same request"""
+        key = f"{self.prefix}:{version}:{time_range}:{'|'.join(normalize_selection(countries))}"
+        return f'{key}:{part}' if part else key
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters['evictions'] += 1
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.counters['local_hits'] += 1
+                return self._entries[key]
+        value = self.cache.get(key)
+        if value is None:
+            self._count('misses')
+            return None
+        self._count('shared_hits')
+        self._remember(key, value)
+        return value
+
+    def preload(self, key, value):
+        """Put a value in the worker LRU only, like the prebuilt outputs of a startup snapshot"""
+        self._remember(key, value)
+
+    def set(self, key, value):
+        self._remember(key, value)
+        self.cache.set(key, value, timeout=self.timeout)
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters, entries=len(self._entries))
+        lookups = stats['local_hits'] + stats['shared_hits'] + stats['misses']
+        stats['hit_rate'] = (lookups - stats['misses']) / lookups if lookups else 0.
+        return stats
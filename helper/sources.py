@@ -0,0 +1,85 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import pandas as pd
+
+from helper.metrics import metrics
+
+# connect and read timeouts in seconds, the read timeout is between two chunks of the body
+TIMEOUT = (10, 60)
+RETRIES = 3
+BACKOFF = 1.
+
+
+def local_path(url, source_dir=None):
+    """File of a source: the file of the same name in source_dir, a file:// url or a path,
+    None for an http(s) url"""
+    parsed = urlparse(url)
+    if source_dir:
+        return os.path.join(source_dir, os.path.basename(parsed.path))
+    if parsed.scheme == 'file':
+        return parsed.path
+    if parsed.scheme in ('http', 'https'):
+        return None
+    return url
+
+
+def make_session(pool_size):
+    import requests
+    # one pool for every source, the connections to the same host are kept alive and reused
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def retryable(error):
+    import requests
+    if isinstance(error, requests.HTTPError):
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return True
+
+
+def read_source(url, session=None, source_dir=None, timeout=TIMEOUT, retries=RETRIES, backoff=BACKOFF):
+    """Parse a csv source while it is downloaded, the download is retried on connection
+    errors, timeouts, 429 and 5xx with an exponential backoff"""
+    path = local_path(url, source_dir)
+    if path is not None:
+        return pd.read_csv(path)
+
+    import requests
+    import urllib3
+    for attempt in range(retries + 1):
+        try:
+            with (session or requests).get(url, stream=True, timeout=timeout) as response:
+                response.raise_for_status()
+                # the parser reads the body from the socket, gzip content-encoding included
+                response.raw.decode_content = True
+                return pd.read_csv(response.raw)
+        # urllib3 errors are raised when the body is cut while it is parsed
+        except (requests.RequestException, urllib3.exceptions.HTTPError) as error:
+            if attempt == retries or not retryable(error):
+                raise
+            time.sleep(backoff * 2 ** attempt)
+
+
+def fetch_sources(urls, source_dir=None, **options):
+    """Download and parse every source of {name: url} at the same time, return {name: dataframe}.
+    The wall time is the one of the slowest source. options are the ones of read_source."""
+    urls = {name: url for name, url in urls.items() if url}
+    if not urls:
+        return {}
+    session = make_session(len(urls))
+
+    def fetch(name):
+        with metrics.span(f'collect_data.source.{name}'):
+            return read_source(urls[name], session, source_dir, **options)
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(urls), thread_name_prefix='source') as pool:
+            return dict(zip(urls, pool.map(fetch, urls)))
+    finally:
+        session.close()
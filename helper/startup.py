@@ -0,0 +1,59 @@
+import hashlib
+import json
+import os
+
+from helper.dataset import replace_atomically
+
+# layout of the snapshot, a snapshot of another layout is built again (2: one output per panel)
+FORMAT = 2
+
+
+def startup_path(data_path):
+    return os.path.splitext(data_path)[0] + '.startup.json'
+
+
+def file_stamp(path):
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def startup_key(settings, paths):
+    """Digest of what the outputs depend on besides the data file: FORMAT, the settings
+    they were built with and the source files building them"""
+    digest = hashlib.sha1(json.dumps([FORMAT, settings], sort_keys=True).encode())
+    for path in sorted(paths):
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def read_startup(data_path, key=None):
+    """
+        Startup snapshot of the data file written by write_startup: dataset version, country
+        list and default outputs of the callbacks by cache key. None when it is missing, has
+        another FORMAT, was built for another content of the data file (mtime/size) or with
+        another key (startup_key: settings and code).
+    """
+    try:
+        with open(startup_path(data_path)) as f:
+            startup = json.load(f)
+        if (startup.get('stamp') != file_stamp(data_path) or startup.get('format') != FORMAT
+                or startup.get('key') != key):
+            return None
+    except (OSError, ValueError):
+        return None
+    return startup
+
+
+def write_startup(data_path, stamp, startup, key=None):
+    """Write the startup snapshot of the data file as it was at stamp, skipped when it changed since"""
+    # the figures are plotly dicts holding numpy arrays
+    from plotly.utils import PlotlyJSONEncoder
+    if file_stamp(data_path) != stamp:
+        return False
+
+    def write(path):
+        with open(path, 'w') as f:
+            json.dump(dict(startup, stamp=stamp, format=FORMAT, key=key), f, cls=PlotlyJSONEncoder)
+    replace_atomically(startup_path(data_path), write)
+    return True
@@ -0,0 +1,83 @@
+import numpy as np
+
+from helper.clientside import typed_array
+from helper.cube import METRICS
+
+# days per chunk sent to the browser, every chunk starts with a full frame
+CHUNK_DAYS = 32
+# marker diameters in steps of 0.5 px up to the 40 px of the largest bubble of the map
+DIAMETER_STEPS = 80
+MAX_DIAMETER = 40
+
+
+class TimeLapse:
+    """
+        >> ATTRIBUTES <<
+        ---------------------------------------------------------------------------------------------
+            * cube: Cube of the dataset version
+            * chunk_days: number of days per chunk
+
+        >> OUTPUT <<
+        -------------------------------------------------------
+        Bubble sizes of the map for every located location and every day, computed in one pass:
+        the cases of a location up to a day are the running max minus the running min of its
+        cumulative series (Cube.summarize of the days up to it), so the last frame is the map
+        of all time. The diameters are quantized to DIAMETER_STEPS, then delta-encoded: a chunk
+        holds the sizes of its first day and, for the next days, only the locations whose size
+        changed.
+    """
+
+    def __init__(self, cube, chunk_days=CHUNK_DAYS):
+        self.chunk_days = chunk_days
+        self.located = np.flatnonzero(cube.located)
+        self.states = cube.states[self.located]
+        self.latitudes = cube.locations['Lat'].to_numpy()[self.located]
+        self.longitudes = cube.locations['Long'].to_numpy()[self.located]
+        self.dates = cube.dates
+
+        confirmed = cube.values[self.located, :, METRICS.index('Confirmed')].astype(np.int64)
+        # the days before the first row of a location repeat its first count (fill_gaps)
+        cases = np.maximum.accumulate(confirmed, axis=1) - np.minimum.accumulate(confirmed, axis=1)
+        largest = max(cases[:, -1].max(initial=0), 1)
+        self.sizes = np.rint(DIAMETER_STEPS * np.sqrt(cases / largest)).astype(np.uint8)
+
+        # (day, location) of every change, sorted by day
+        days, locations = np.nonzero((self.sizes[:, 1:] != self.sizes[:, :-1]).T)
+        self.change_days = days + 1
+        self.change_locations = locations
+        self.change_offsets = np.searchsorted(self.change_days, np.arange(len(self.dates) + 1))
+
+    @property
+    def n_chunks(self):
+        return -(-len(self.dates) // self.chunk_days)
+
+    def meta(self, version):
+        """Everything the browser needs before the first chunk"""
+        return {
+            'version': version,
+            'dates': typed_array(self.dates.astype('datetime64[D]').astype(np.int64), 'int32'),
+            'states': self.states.tolist(),
+            'lat': typed_array(self.latitudes, 'float32'),
+            'lon': typed_array(self.longitudes, 'float32'),
+            'chunk_days': self.chunk_days,
+            'n_chunks': self.n_chunks,
+            # sizemode area: the marker size is the square of the quantized diameter
+            'sizeref': 2. * DIAMETER_STEPS ** 2 / MAX_DIAMETER ** 2,
+        }
+
+    def chunk(self, version, index):
+        start = index * self.chunk_days
+        stop = min(start + self.chunk_days, len(self.dates))
+        first, last = self.change_offsets[start + 1], self.change_offsets[stop]
+        locations = self.change_locations[first:last]
+        index_dtype = 'uint16' if len(self.located) <= np.iinfo(np.uint16).max + 1 else 'int32'
+        return {
+            'version': version,
+            'index': index,
+            'start': start,
+            'key': typed_array(self.sizes[:, start], 'uint8'),
+            # number of changes of each day after the first one, then their locations and sizes
+            'counts': typed_array(np.diff(self.change_offsets[start + 1:stop + 1]), 'int32'),
+            'locations': typed_array(locations, index_dtype),
+            'sizes': typed_array(self.sizes[locations, self.change_days[first:last]], 'uint8'),
+        }
@@ -0,0 +1,30 @@
+"""Datasets shared by the tests.
+
+    python -m pytest
+
+`data` is the synthetic dataset of benchmark/derived.py: dropped rows, locations
+stopping before the last day and States shared by several locations, with a few
+locations missing their coordinates.
+"""
+import numpy as np
+import pytest
+
+from benchmark.derived import dataset_with_gaps
+from helper.cube import Cube
+from helper.data_model import CompactData
+
+
+@pytest.fixture(scope='session')
+def data():
+    df = dataset_with_gaps(120, 400)
+    location = df.groupby(['State', 'Lat', 'Long'], sort=False).ngroup()
+    df.loc[location % 13 == 4, 'Lat'] = np.nan
+    df.loc[location % 26 == 4, 'Long'] = np.nan
+    # the second location of the State Location 10
+    df.loc[location == 11, ['Lat', 'Long']] = np.nan
+    return CompactData.from_long(df)
+
+
+@pytest.fixture(scope='session')
+def cube(data):
+    return Cube(data)
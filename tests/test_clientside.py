@@ -0,0 +1,66 @@
+import json
+import os
+import shutil
+import subprocess
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from helper.clientside import encode_dataset
+from helper.cube import Cube
+from helper.data_model import CompactData
+from helper.data_preparation import rolling_mean
+from helper.derived import Derived
+
+CLIENTSIDE = os.path.join(os.path.dirname(__file__), os.pardir, 'assets', 'clientside.js')
+# the virality plots of the browser for every query read from stdin
+RUNNER = '''
+var fs = require('fs');
+global.window = {dash_clientside: {}};
+global.atob = function (encoded) { return Buffer.from(encoded, 'base64').toString('binary'); };
+eval(fs.readFileSync(process.argv[1], 'utf8'));
+var input = JSON.parse(fs.readFileSync(0, 'utf8'));
+process.stdout.write(JSON.stringify(input.queries.map(function (query) {
+    var virality = window.dash_clientside.dataset.panels(input.store, query[0], query[1])[1];
+    return virality.data.map(function (trace) { return [trace.name, trace.y]; });
+})));
+'''
+
+Snapshot = namedtuple('Snapshot', ['version', 'cube'])
+
+pytestmark = pytest.mark.skipif(shutil.which('node') is None, reason='node is not installed')
+
+
+def browser_virality(cube, queries):
+    store = encode_dataset(Snapshot('test', cube))
+    output = subprocess.run(['node', '-e', RUNNER, CLIENTSIDE], input=json.dumps({'store': store, 'queries': queries}),
+                            capture_output=True, text=True, check=True).stdout
+    return [{name: np.array(y, dtype=float) for name, y in traces} for traces in json.loads(output)]
+
+
+def assert_same_virality(cube, queries):
+    derived = Derived(cube)
+    for (countries, time_range), traces in zip(queries, browser_virality(cube, queries)):
+        if countries:
+            expected = rolling_mean(derived.daily_cases(countries, time_range))
+            for country in countries:
+                np.testing.assert_allclose(traces[country], expected[country].to_numpy(), rtol=1e-9)
+        else:
+            np.testing.assert_allclose(traces['World Wide'], derived.world(time_range).to_numpy(), rtol=1e-9)
+
+
+def test_virality_like_the_server(cube):
+    queries = [[countries, time_range]
+               for countries in [[], ['Location 0'], ['Location 3', 'Location 20'], ['Location 5', 'Location 7']]
+               for time_range in [0, 90, 30, 15, 7]]
+    assert_same_virality(cube, queries)
+
+
+def test_virality_clamped_per_location():
+    # test_derived.test_daily_cases_clamped_per_location
+    rows = ([('A', 1.0, 1.0, f'2020-01-0{day + 1}', confirmed, 0) for day, confirmed in enumerate([10, 20, 15, 30])]
+            + [('A', 2.0, 2.0, f'2020-01-0{day + 1}', confirmed, 0) for day, confirmed in enumerate([0, 5, 10, 15])])
+    cube = Cube(CompactData.from_long(pd.DataFrame(rows, columns=['State', 'Lat', 'Long', 'Date', 'Confirmed', 'Death'])))
+    assert_same_virality(cube, [[['A'], 0], [[], 0]])
@@ -0,0 +1,45 @@
+from flask import Flask, jsonify, request
+from flask_caching import Cache
+
+from helper.conditional import ConditionalResponses
+from helper.result_cache import ResultCache
+
+
+def update_component(calls):
+    server = Flask(__name__)
+    cache = Cache(server, config={'CACHE_TYPE': 'SimpleCache'})
+
+    @server.route('/_dash-update-component', methods=['POST'])
+    def update():
+        calls.append(request.get_json())
+        return jsonify(response={'countries': request.get_json()['inputs'][0]['value']})
+
+    ConditionalResponses(server, lambda: 'v1', ResultCache(cache, prefix='response'),
+                         gates=['loaded_0', 'detailed_plot_ready'])
+    return server.test_client()
+
+
+def post(client, countries, loaded):
+    body = {'output': 'virality_base.data', 'changedPropIds': ['loaded_0.data'],
+            'inputs': [{'id': 'country_dropdown', 'property': 'value', 'value': countries},
+                       {'id': 'loaded_0', 'property': 'data', 'value': loaded}]}
+    return client.post('/_dash-update-component', json=body, headers={'Accept-Encoding': 'gzip'})
+
+
+def test_gate_values_share_the_response():
+    # the stage counter of every tab gives one ETag and one compressed body
+    calls = []
+    client = update_component(calls)
+    etags = {post(client, ['France'], loaded).headers['ETag'] for loaded in [1, 2, 3]}
+    assert len(etags) == 1
+    assert len(calls) == 1
+    # the callback still gets the value sent by the browser
+    assert calls[0]['inputs'][1]['value'] == 1
+
+
+def test_gate_set_or_not():
+    calls = []
+    client = update_component(calls)
+    assert post(client, ['France'], None).headers['ETag'] != post(client, ['France'], 1).headers['ETag']
+    assert post(client, ['Spain'], 1).headers['ETag'] != post(client, ['France'], 1).headers['ETag']
+    assert len(calls) == 3
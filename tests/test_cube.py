@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from helper.data_model import ordinal_dates
+from helper.data_preparation import filter_df, sumurize_by_country
+from helper.derived import PRESETS
+
+# presets of the time dropdown, other ranges, the whole dataset and longer
+TIME_RANGES = PRESETS + [1, 7, 399, 400, 10 ** 6]
+# pd.Timedelta overflows past ~292 years in the original filter_by_dates
+ORIGINAL_TIME_RANGES = TIME_RANGES[:-1]
+SELECTIONS = [
+    None,
+    ['Location 2'],
+    # States with two locations, one of them without coordinates for Location 10
+    ['Location 0', 'Location 10'],
+    # missing coordinates
+    ['Location 4', 'Location 17'],
+    # stops a month before the last day
+    ['Location 3'],
+    ['Location 3', 'Location 20', 'Location 41'],
+    # no location, e.g. renamed by a refresh
+    ['Nowhere'],
+]
+
+
+# the functions of the long frame replaced by the cube
+def original_filter_df(df, countries, time_range):
+    if countries:
+        df = df[df['State'].isin(countries)]
+    if time_range != 0:
+        last_day = df['Date'].max()
+        time_range = last_day - pd.Timedelta(days=time_range)
+        df = df[df['Date'] > time_range]
+    return df
+
+
+def original_sumurize_by_country(df):
+    usefull_columns = ['Death', 'Confirmed']
+    df = df.groupby(['Lat', 'Long', 'State']).apply(
+        lambda x: x.max() - x.min())
+    return df.loc[:, usefull_columns].reset_index()
+
+
+@pytest.fixture(scope='module')
+def long(data):
+    return data.to_long()
+
+
+@pytest.mark.parametrize('countries', SELECTIONS)
+@pytest.mark.parametrize('time_range', ORIGINAL_TIME_RANGES)
+def test_summarize_like_the_long_frame(long, cube, countries, time_range):
+    expected = original_sumurize_by_country(original_filter_df(long, countries, time_range))
+    pd.testing.assert_frame_equal(cube.summarize(countries, time_range), expected, check_dtype=False)
+
+
+@pytest.mark.parametrize('countries', SELECTIONS)
+@pytest.mark.parametrize('time_range', ORIGINAL_TIME_RANGES)
+def test_window_like_the_long_frame(long, cube, countries, time_range):
+    selection = cube.select(countries)
+    start = cube.window(time_range, selection)
+    dates = cube.dates[start:][cube.present[selection, start:].any(axis=0)]
+    expected = np.sort(original_filter_df(long, countries, time_range)['Date'].unique())
+    np.testing.assert_array_equal(dates, expected)
+
+
+@pytest.mark.parametrize('countries', SELECTIONS)
+@pytest.mark.parametrize('time_range', TIME_RANGES)
+def test_summarize(data, cube, countries, time_range):
+    expected = sumurize_by_country(filter_df(data, countries, time_range))
+    pd.testing.assert_frame_equal(cube.summarize(countries, time_range), expected, check_dtype=False)
+
+
+@pytest.mark.parametrize('countries', SELECTIONS)
+@pytest.mark.parametrize('time_range', TIME_RANGES)
+def test_window(data, cube, countries, time_range):
+    # the dates of filter_df are the dates from the window on with a row of the selection
+    selection = cube.select(countries)
+    start = cube.window(time_range, selection)
+    dates = cube.dates[start:][cube.present[selection, start:].any(axis=0)]
+    expected = np.unique(ordinal_dates(filter_df(data, countries, time_range).facts['day']))
+    np.testing.assert_array_equal(dates, expected)
+    # and the window starts right after the last excluded date
+    if start > 0 and time_range:
+        last_day = dates[-1]
+        assert last_day - cube.dates[start - 1] >= np.timedelta64(time_range, 'D')
+        assert last_day - cube.dates[start] < np.timedelta64(time_range, 'D')
+
+
+def test_missing_coordinates(data, cube):
+    # kept by the cube, left out of the summary like the groupby on coordinates
+    assert not cube.located.all()
+    assert not cube.summarize()['State'].isin(['Location 4']).any()
+    assert cube.summarize(['Location 10'])['State'].tolist() == ['Location 10']
@@ -0,0 +1,30 @@
+import pandas as pd
+import pytest
+
+from helper.data_model import CompactData
+from helper.data_preparation import filter_df, get_daily_case
+
+
+@pytest.mark.parametrize('time_range', [0, 30])
+def test_filter_df_without_rows(data, time_range):
+    # a selection without rows, e.g. a location renamed by a refresh still selected in a tab
+    filtered = filter_df(data, ['Nowhere'], time_range)
+    assert len(filtered.facts) == 0
+    assert filtered.locations is data.locations
+
+
+def test_daily_cases_by_location():
+    # one State name for two locations, as Diamond Princess in the JHU global file: the
+    # differences are taken by location, the first row of every location is 0. Grouped
+    # by State, as before the compact data, the first row of the second location was
+    # 100 - 30 = 70.
+    data = CompactData.from_long(pd.DataFrame(
+        [('Diamond Princess', 1.0, 1.0, f'2020-01-0{day + 1}', confirmed, 0)
+         for day, confirmed in enumerate([10, 20, 30])]
+        + [('Diamond Princess', 2.0, 2.0, f'2020-01-0{day + 1}', confirmed, 0)
+           for day, confirmed in enumerate([100, 102, 104])],
+        columns=['State', 'Lat', 'Long', 'Date', 'Confirmed', 'Death']))
+    daily_cases = get_daily_case(data)
+    assert daily_cases.tolist() == [0, 10, 10, 0, 2, 2]
+    assert daily_cases.index.names == ['Date', 'State']
+    assert set(daily_cases.index.get_level_values('State')) == {'Diamond Princess'}
@@ -0,0 +1,40 @@
+import pandas as pd
+import pytest
+
+from benchmark.derived import check
+from helper.cube import Cube
+from helper.data_model import CompactData
+from helper.derived import Derived
+
+
+def long_frame(rows):
+    return pd.DataFrame(rows, columns=['State', 'Lat', 'Long', 'Date', 'Confirmed', 'Death'])
+
+
+def test_derived_matches_on_the_fly(data, cube):
+    states = sorted(set(cube.states))
+    selections = [None, states[:1], states[:5], ['Location 0', 'Location 1'], ['Location 5', 'Location 7']]
+    assert check(data, cube, Derived(cube), selections) == []
+
+
+def test_daily_cases_clamped_per_location():
+    # a downward revision of a location doesn't cancel the new cases of the other one
+    data = CompactData.from_long(long_frame(
+        [('A', 1.0, 1.0, f'2020-01-0{day + 1}', confirmed, 0) for day, confirmed in enumerate([10, 20, 15, 30])]
+        + [('A', 2.0, 2.0, f'2020-01-0{day + 1}', confirmed, 0) for day, confirmed in enumerate([0, 5, 10, 15])]))
+    cube = Cube(data)
+    expected = [0, 15, 5, 20]
+    assert cube.daily_cases()['A'].tolist() == expected
+    assert Derived(cube).daily_cases()['A'].tolist() == expected
+
+
+@pytest.mark.parametrize('time_range', [2, 3])
+def test_first_row_of_a_location_in_the_window(time_range):
+    # the location B has no row on the first day of the window
+    data = CompactData.from_long(long_frame(
+        [('A', 1.0, 1.0, f'2020-01-0{day + 1}', 10 * day, 0) for day in range(5)]
+        + [('B', 2.0, 2.0, f'2020-01-0{day + 1}', 100 * day, 0) for day in [0, 1, 3, 4]]))
+    cube = Cube(data)
+    expected = {2: [0, 100], 3: [0, 0, 100]}[time_range]
+    assert cube.daily_cases(['B'], time_range)['B'].tolist() == expected
+    assert Derived(cube).daily_cases(['B'], time_range)['B'].tolist() == expected
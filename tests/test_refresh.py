@@ -0,0 +1,55 @@
+import fcntl
+import os
+
+import pandas as pd
+import pytest
+
+from benchmark.synthetic import synthetic_source
+from helper.dataset import Dataset
+from helper.refresh import RefreshScheduler
+
+DAY = 24 * 60 * 60
+
+
+@pytest.fixture
+def scheduler(tmp_path):
+    # local sources with the layout of the JHU time series, and a collected file a day old
+    sources = {}
+    for metric in ['Confirmed', 'Death', 'Recovered']:
+        sources[f'url_{metric.lower()}'] = str(tmp_path / f'{metric}.csv')
+        synthetic_source(20, 30, metric).to_csv(sources[f'url_{metric.lower()}'], index=False)
+    saving_path = str(tmp_path / 'data.csv')
+    with open(saving_path, 'w') as f:
+        f.write('previous dataset\n')
+    os.utime(saving_path, (os.path.getmtime(saving_path) - DAY,) * 2)
+    return RefreshScheduler(saving_path, interval=DAY, **sources)
+
+
+def test_run_once_replaces_the_file(scheduler):
+    # a reader of the previous file keeps reading it whole
+    with open(scheduler.saving_path) as previous:
+        assert scheduler.run_once()
+        assert previous.read() == 'previous dataset\n'
+        assert os.fstat(previous.fileno()).st_ino != os.stat(scheduler.saving_path).st_ino
+    collected = pd.read_csv(scheduler.saving_path)
+    assert collected['State'].nunique() == 20
+    assert not [name for name in os.listdir(os.path.dirname(scheduler.saving_path)) if name.endswith('.tmp')]
+    # not due anymore
+    assert not scheduler.run_once()
+
+
+def test_run_once_while_locked(scheduler):
+    # another worker holds the lock: no collection, no wait
+    with open(scheduler.lock_path, 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        assert not scheduler.run_once()
+    with open(scheduler.saving_path) as f:
+        assert f.read() == 'previous dataset\n'
+    assert scheduler.run_once()
+
+
+def test_background_reload_without_the_file(tmp_path):
+    # the file is being replaced: no reload, nothing raised in the thread
+    dataset = Dataset(str(tmp_path / 'missing.csv'))
+    dataset._refresh_in_background()
+    assert dataset._stamp is None
@@ -0,0 +1,91 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+import pytest
+
+from benchmark import startup
+from benchmark.synthetic import synthetic_dataset
+from data.collect_data import save_columnar
+from helper.startup import startup_key, startup_path
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# the map of the first page as served after the boot, and whether the snapshot was read
+MAP_PROBE = '''
+import json, sys
+sys.path.insert(0, sys.argv[1])
+import app
+with app.server.test_request_context():
+    map_base, view = app.update_map(0, None, None, None)
+print(json.dumps({'startup_snapshot': app.startup is not None,
+                  'mapbox': map_base['figure']['layout']['mapbox']}))
+'''
+
+
+@pytest.fixture
+def directory(tmp_path):
+    # the data file is fresh and the sources point to this directory: the app never downloads
+    os.makedirs(tmp_path / 'data')
+    csv_path = str(tmp_path / 'data' / 'spreading_covid19.csv')
+    df = synthetic_dataset(40, 60)
+    df.to_csv(csv_path, index=False)
+    save_columnar(df, csv_path)
+    return tmp_path
+
+
+def environment(directory, **environ):
+    env = dict(os.environ, DATA_SOURCE_DIR=str(directory), **environ)
+    for name in ['MAPBOX_TOKEN', 'COMPACT_FIGURES', 'FIGURE_TYPED_ARRAYS']:
+        if name not in environ:
+            env.pop(name, None)
+    return env
+
+
+def boot(directory, probe, **environ):
+    env = environment(directory, **environ)
+    output = subprocess.run([sys.executable, '-c', probe, ROOT], cwd=directory, env=env,
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def test_snapshot_without_the_mapbox_token(directory):
+    first = boot(directory, MAP_PROBE, MAPBOX_TOKEN='pk.first')
+    assert not first['startup_snapshot']
+    snapshot = startup_path(str(directory / 'data' / 'spreading_covid19.feather'))
+    with open(snapshot) as f:
+        assert 'pk.first' not in f.read()
+    # a rotated token is served from the same snapshot
+    rotated = boot(directory, MAP_PROBE, MAPBOX_TOKEN='pk.rotated')
+    assert rotated['startup_snapshot']
+    assert rotated['mapbox']['accesstoken'] == 'pk.rotated'
+    assert dict(rotated['mapbox'], accesstoken='pk.first') == first['mapbox']
+
+
+@pytest.mark.parametrize('environ', [{'COMPACT_FIGURES': '0'}, {'FIGURE_TYPED_ARRAYS': '1'}])
+def test_snapshot_of_other_settings(directory, environ):
+    assert not boot(directory, MAP_PROBE)['startup_snapshot']
+    assert boot(directory, MAP_PROBE)['startup_snapshot']
+    # built again with the new settings, then read
+    assert not boot(directory, MAP_PROBE, **environ)['startup_snapshot']
+    assert boot(directory, MAP_PROBE, **environ)['startup_snapshot']
+
+
+def test_key_of_the_code(tmp_path):
+    source = tmp_path / 'build.py'
+    source.write_text('def build_map(): pass\n')
+    key = startup_key({'compact_figures': True}, [str(source)])
+    assert startup_key({'compact_figures': True}, [str(source)]) == key
+    assert startup_key({'compact_figures': False}, [str(source)]) != key
+    source.write_text('def build_map(): return {}\n')
+    assert startup_key({'compact_figures': True}, [str(source)]) != key
+
+
+def test_boot_budget(directory):
+    # python -m benchmark.startup: the first boot builds the snapshot, the next ones read it
+    runs = [startup.probe(str(directory), environment(directory)) for _ in range(4)]
+    assert not runs[0]['startup_snapshot']
+    assert all(run['startup_snapshot'] for run in runs[1:])
+    assert not any(run['pandas_at_boot'] for run in runs[1:])
+    assert statistics.median(run['boot_seconds'] for run in runs[1:]) < startup.BUDGET